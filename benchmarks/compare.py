@@ -0,0 +1,53 @@
+import argparse
+import json
+
+
+def flatten(dict_: dict, prefix: str = ""):
+    result = dict()
+    for key, value in dict_.items():
+        if isinstance(value, dict):
+            result.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            result[f"{prefix}{key}"] = value
+    return result
+
+
+def load(path: str):
+    with open(path, encoding="utf-8") as file:
+        report = json.load(file)
+    dict_ = dict()
+    for result in report["results"]:
+        key = (result["panels"], result["series"], result["seconds"], result["rate"])
+        dict_[key] = flatten(result)
+    return report["metadata"], flatten(report.get("startup", dict())), dict_
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="benchmarks/compare.py")
+    parser.add_argument("base", help="比較元の結果JSON")
+    parser.add_argument("head", help="比較先の結果JSON")
+    parser.add_argument("--metric", action="append", help="表示する指標 (複数指定可, 省略時: すべて)")
+    parser.add_argument("--threshold", type=float, default=0.0, help="この割合以上変化した指標のみ表示します (例: 0.1)")
+    args = parser.parse_args()
+    base_metadata, base_startup, base = load(args.base)
+    head_metadata, head_startup, head = load(args.head)
+    print(f"base: {base_metadata['commit']}  head: {head_metadata['commit']}")
+    if base_startup and head_startup:
+        base[("startup",)] = base_startup
+        head[("startup",)] = head_startup
+    for key in sorted(set(base) & set(head), key=str):
+        print("startup" if key == ("startup",) else "panels={} series={} seconds={} rate={}".format(*key))
+        for metric, value in head[key].items():
+            if metric in ("panels", "series", "seconds", "rate") or metric not in base[key]:
+                continue
+            if (args.metric is not None) and not any([metric.startswith(x) for x in args.metric]):
+                continue
+            if value == base[key][metric]:
+                continue
+            if not base[key][metric]:
+                print(f"  {metric:32} {base[key][metric]:14.3f} {value:14.3f} {'-':>9}")
+                continue
+            ratio = value / base[key][metric]
+            if abs(ratio - 1) < args.threshold:
+                continue
+            print(f"  {metric:32} {base[key][metric]:14.3f} {value:14.3f} {ratio:8.2f}x")
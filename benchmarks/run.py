@@ -0,0 +1,166 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import matplotlib
+matplotlib.use("Agg")
+import numpy
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import streamplotter
+from streamplotter import __main__ as server
+
+
+def percentiles(list_: list):
+    array = numpy.array(list_) * 1000
+    dict_ = {
+        "p50": float(numpy.percentile(array, 50)),
+        "p90": float(numpy.percentile(array, 90)),
+        "p99": float(numpy.percentile(array, 99)),
+        "max": float(array.max())
+    }
+    return dict_
+
+
+def timeit(function, repeat: int):
+    list_ = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        list_.append(time.perf_counter() - start)
+    return list_
+
+
+def metadata():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    dict_ = {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "matplotlib": matplotlib.__version__,
+        "platform": platform.platform(),
+        "time": time.time()
+    }
+    return dict_
+
+
+def startup(repeat: int):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    statements = {
+        "import": "import streamplotter",
+        "import_main": "import streamplotter.__main__",
+        "ingest": "import streamplotter; streamplotter.StreamPlotter(ingest=True)",
+        "plotter": "import streamplotter; streamplotter.StreamPlotter(headless=True)"
+    }
+    dict_ = dict()
+    for name, statement in statements.items():
+        code = f"import sys, time; start = time.perf_counter(); {statement}; print(time.perf_counter() - start, int('matplotlib' in sys.modules))"
+        list_ = list()
+        for _ in range(repeat):
+            str_ = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True).stdout
+            seconds, loaded = str_.split()
+            list_.append(float(seconds))
+        dict_[name] = {"ms": percentiles(list_), "matplotlib_loaded": int(loaded)}
+    return dict_
+
+
+def measure(panels: int, series: int, seconds: int, rate: int, repeat: int, requests: int):
+    random = numpy.random.default_rng(0)
+    plotter = streamplotter.StreamPlotter("benchmark", headless=True)
+    scene = plotter.scene
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    lines = list()
+    for index in range(panels):
+        panel = scene.add_panel(f"panel{index}", seconds=seconds)
+        for _ in range(series):
+            lines.append(scene.add_series(panel))
+    now = time.time()
+    timestamps = now - numpy.arange(seconds, 0, -1, dtype=float)
+    for line in lines:
+        line.data.restore(timestamps, numpy.cumsum(random.standard_normal(seconds)))
+    memory = (tracemalloc.get_traced_memory()[0] - before) / len(lines)
+    tracemalloc.stop()
+    plotter.update()
+    values = random.standard_normal(rate).tolist()
+    start = time.perf_counter()
+    for line in lines:
+        for value in values:
+            line.data.append(value)
+    ingest = time.perf_counter() - start
+    groups = [group for panel in scene.panels.values() for group in panel.groups.values()]
+    tick = timeit(lambda: [group.update() for group in groups], 1)
+    latest = timeit(lambda: [line.data.latest(seconds) for line in lines], repeat)
+    yrange = timeit(lambda: [streamplotter.Axes(axes).get_yrange() for axes in plotter.figure.axes], repeat)
+    update = timeit(plotter.update, repeat)
+    frame = timeit(lambda: (plotter.update(), plotter.figure.canvas.draw()), repeat)
+    server._Plotter = plotter
+    client = server._App.test_client()
+    line = lines[0]
+    post = timeit(lambda: client.post(f"/figure/{line.panel.id}/{line.id}", json={"value": 1.0}), requests)
+    data = timeit(lambda: client.get(f"/figure/{line.panel.id}/{line.id}/data"), requests)
+    image = timeit(lambda: (plotter.frames.clear(), client.get("/figure/image")), repeat)
+    for panel in list(scene.panels.values()):
+        scene.remove_panel(panel)
+    plotter.update()
+    matplotlib.pyplot.close(plotter.figure)
+    dict_ = {
+        "panels": panels,
+        "series": series,
+        "seconds": seconds,
+        "rate": rate,
+        "ingest_points_per_second": len(lines) * rate / ingest,
+        "tick_ms": tick[0] * 1000,
+        "latest_ms": percentiles(latest),
+        "yrange_ms": percentiles(yrange),
+        "update_ms": percentiles(update),
+        "frame_ms": percentiles(frame),
+        "memory_bytes_per_series": memory,
+        "request_ms": {
+            "post_data": percentiles(post),
+            "get_data": percentiles(data),
+            "get_image": percentiles(image)
+        }
+    }
+    return dict_
+
+
+def integers(str_: str):
+    list_ = [int(x) for x in str_.split(",")]
+    return list_
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="benchmarks/run.py")
+    parser.add_argument("--panels", type=integers, default=[1, 4], help="プロットエリア数 (カンマ区切り)")
+    parser.add_argument("--series", type=integers, default=[1, 10], help="プロットエリアあたりのデータ系列数 (カンマ区切り)")
+    parser.add_argument("--seconds", type=integers, default=[100, 3600], help="期間(秒) (カンマ区切り)")
+    parser.add_argument("--rate", type=integers, default=[10, 1000], help="データ系列あたりの1秒間の追加点数 (カンマ区切り)")
+    parser.add_argument("--repeat", type=int, default=20, help="描画・取得の計測回数")
+    parser.add_argument("--requests", type=int, default=200, help="HTTPリクエストの計測回数")
+    parser.add_argument("--startup", type=int, default=5, help="起動時間の計測回数 (別プロセスで計測)")
+    parser.add_argument("--output", metavar="FILE", help="結果のJSONを保存するファイル (省略時: 標準出力)")
+    args = parser.parse_args()
+    results = list()
+    for panels, series, seconds, rate in itertools.product(args.panels, args.series, args.seconds, args.rate):
+        result = measure(panels, series, seconds, rate, args.repeat, args.requests)
+        results.append(result)
+        print(f"panels={panels} series={series} seconds={seconds} rate={rate} ingest={result['ingest_points_per_second']:.0f}/s frame={result['frame_ms']['p50']:.2f}ms", file=sys.stderr)
+    startup_ = startup(args.startup)
+    print(f"import={startup_['import']['ms']['p50']:.0f}ms plotter={startup_['plotter']['ms']['p50']:.0f}ms", file=sys.stderr)
+    if startup_["import"]["matplotlib_loaded"] or startup_["ingest"]["matplotlib_loaded"]:
+        print("warning: matplotlib is loaded without a figure", file=sys.stderr)
+    report = {"metadata": metadata(), "startup": startup_, "results": results}
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
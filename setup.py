@@ -3,8 +3,9 @@ import setuptools
 options = {
     "name": "StreamPlotter",
     "version": "0.0.0",
-    "python_requires": ">=3.7",
+    "python_requires": ">=3.8",
     "install_requires": open("requirements.txt").read().splitlines(),
+    "extras_require": {"production": ["waitress"], "parquet": ["pyarrow"]},
     "packages": setuptools.find_packages()
 }
 setuptools.setup(**options)
@@ -1,103 +1,2169 @@
+from __future__ import annotations
+import bisect
 import collections
-import itertools
-import japanize_matplotlib
+import contextlib
+import csv
+import functools
+import heapq
+import io
+import json
 import math
-import matplotlib.animation
-import matplotlib.figure
-import matplotlib.lines
-import matplotlib.pyplot
+import multiprocessing
+import multiprocessing.shared_memory
 import numpy
+import operator
+import os
+import socket
 import sys
 import threading
 import time
+import traceback
 import uuid
 
 
+def load():
+    global japanize_matplotlib, matplotlib
+    import japanize_matplotlib
+    import matplotlib.figure
+    import matplotlib.gridspec
+    import matplotlib.lines
+    import matplotlib.pyplot
+
+
+class Histogram:
+
+    bounds = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self, bounds: tuple = None):
+        self.bounds = self.bounds if bounds is None else tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def samples(self):
+        list_ = list()
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), self.counts):
+            cumulative += count
+            list_.append(("_bucket", {"le": "+Inf" if math.isinf(bound) else repr(bound)}, cumulative))
+        list_.append(("_sum", dict(), self.total))
+        list_.append(("_count", dict(), self.count))
+        return list_
+
+
+class Counter:
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def samples(self):
+        list_ = [("", dict(), self.value)]
+        return list_
+
+
+class Metrics:
+
+    def __init__(self):
+        self.families = dict()
+        self.lock = threading.Lock()
+
+    def family(self, name: str, kind: str, help: str, labels: dict, factory):
+        family = self.families.get(name)
+        if family is None:
+            with self.lock:
+                family = self.families.setdefault(name, (kind, help or name, dict()))
+        key = tuple(sorted(labels.items()))
+        metric = family[2].get(key)
+        if metric is None:
+            with self.lock:
+                metric = family[2].setdefault(key, factory())
+        return metric
+
+    def histogram(self, name: str, help: str = None, bounds: tuple = None, **labels) -> Histogram:
+        histogram = self.family(name, "histogram", help, labels, lambda: Histogram(bounds))
+        return histogram
+
+    def counter(self, name: str, help: str = None, **labels) -> Counter:
+        counter = self.family(name, "counter", help, labels, Counter)
+        return counter
+
+    def register(self, name: str, kind: str, help: str, metric, **labels):
+        self.family(name, kind, help, labels, lambda: metric)
+
+    def collect(self, name: str, kind: str, help: str, function):
+        self.family(name, kind, help, dict(), lambda: function)
+
+    def escape(self, value) -> str:
+        str_ = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        return str_
+
+    def format(self, name: str, labels: dict, value: float) -> str:
+        pairs = ",".join([f'{key}="{self.escape(x)}"' for key, x in labels.items()])
+        str_ = f"{name}{{{pairs}}} {float(value)!r}" if pairs else f"{name} {float(value)!r}"
+        return str_
+
+    def render(self) -> str:
+        lines = list()
+        with self.lock:
+            families = [(name, kind, help, list(metrics.items())) for name, (kind, help, metrics) in self.families.items()]
+        for name, kind, help, metrics in sorted(families):
+            lines.append(f"# HELP {name} {self.escape(help)}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, metric in metrics:
+                if callable(metric):
+                    result = metric()
+                    samples = [("", labels, value) for labels, value in result] if isinstance(result, list) else [("", dict(), result)]
+                else:
+                    samples = metric.samples()
+                for suffix, labels, value in samples:
+                    lines.append(self.format(name + suffix, {**dict(key), **labels}, value))
+        str_ = "\n".join(lines) + "\n"
+        return str_
+
+
+class Scheduler:
+
+    def __init__(self):
+        self.buckets = dict()
+        self.heap = list()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.wakeups = 0
+        self.ticks = 0
+        self.errors = 0
+        self.lateness = Histogram()
+        self.duration = Histogram()
+
+    @property
+    def threads(self) -> int:
+        int_ = 1 if (self.thread is not None and self.thread.is_alive()) else 0
+        return int_
+
+    @property
+    def streams(self) -> int:
+        with self.condition:
+            int_ = sum([len(x) for x in self.buckets.values()])
+        return int_
+
+    def stats(self):
+        dict_ = {
+            "threads": self.threads,
+            "streams": self.streams,
+            "intervals": len(self.buckets),
+            "wakeups": self.wakeups,
+            "ticks": self.ticks,
+            "errors": self.errors
+        }
+        return dict_
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def register(self, stream):
+        with self.condition:
+            bucket = self.buckets.get(stream.interval)
+            if bucket is None:
+                bucket = dict()
+                self.buckets[stream.interval] = bucket
+                heapq.heappush(self.heap, (time.time() + stream.interval, stream.interval))
+                self.condition.notify()
+            bucket[stream] = None
+            self.start()
+
+    def unregister(self, stream):
+        with self.condition:
+            bucket = self.buckets.get(stream.interval, dict())
+            registered = stream in bucket
+            bucket.pop(stream, None)
+        return registered
+
+    def next(self):
+        with self.condition:
+            while True:
+                now = time.time()
+                if len(self.heap) > 0 and self.heap[0][0] <= now:
+                    break
+                timeout = self.heap[0][0] - now if len(self.heap) > 0 else None
+                self.condition.wait(timeout)
+                self.wakeups += 1
+            due, interval = heapq.heappop(self.heap)
+            self.lateness.observe(max(now - due, 0.0))
+            bucket = self.buckets.get(interval)
+            if bucket is None or len(bucket) == 0:
+                self.buckets.pop(interval, None)
+                return list()
+            missed = (now - due) // interval
+            due += interval * (missed + 1)
+            heapq.heappush(self.heap, (due, interval))
+            list_ = list(bucket)
+        return list_
+
+    def run(self):
+        while True:
+            streams = self.next()
+            start = time.perf_counter()
+            for stream in streams:
+                try:
+                    stream.update()
+                except Exception:
+                    self.errors += 1
+                    traceback.print_exc()
+            self.duration.observe(time.perf_counter() - start)
+            self.ticks += 1
+
+
+class Tier:
+
+    def __init__(self, step: int, seconds: int):
+        self.step = step
+        self.seconds = seconds
+        self.buffer = numpy.full(((seconds // step) + 1, 4), numpy.nan)
+        self.head = 0
+        self.count = 0
+        self.index = None
+        self.reset()
+
+    @property
+    def capacity(self) -> int:
+        int_ = len(self.buffer)
+        return int_
+
+    @property
+    def current(self):
+        mean = self.total / self.number if self.number > 0 else numpy.nan
+        tuple_ = (self.low, self.high, mean, self.number)
+        return tuple_
+
+    def reset(self):
+        self.total = 0.0
+        self.number = 0
+        self.low = numpy.nan
+        self.high = numpy.nan
+
+    def clear(self):
+        self.buffer.fill(numpy.nan)
+        self.head = 0
+        self.count = 0
+        self.index = None
+        self.reset()
+
+    def push(self):
+        self.buffer[self.head] = self.current
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self.reset()
+
+    def add(self, timestamp: float, value: float):
+        index = int(timestamp // self.step)
+        self.index = index if self.index is None else self.index
+        for _ in range(min(index - self.index, self.capacity)):
+            self.push()
+        self.index = max(index, self.index)
+        if numpy.isnan(value):
+            return
+        self.total += value
+        self.number += 1
+        self.low = value if not value >= self.low else self.low
+        self.high = value if not value <= self.high else self.high
+
+    def restore(self, timestamps: numpy.ndarray, values: numpy.ndarray):
+        self.clear()
+        if len(timestamps) == 0:
+            return
+        indices = (timestamps // self.step).astype(numpy.int64)
+        last = indices[-1]
+        offsets = indices - (last - self.capacity)
+        valid = (offsets >= 0) & ~numpy.isnan(values)
+        offsets = offsets[valid]
+        values = values[valid]
+        count = numpy.bincount(offsets, minlength=self.capacity + 1).astype(float)
+        total = numpy.bincount(offsets, weights=values, minlength=self.capacity + 1)
+        low = numpy.full(self.capacity + 1, numpy.inf)
+        high = numpy.full(self.capacity + 1, -numpy.inf)
+        numpy.minimum.at(low, offsets, values)
+        numpy.maximum.at(high, offsets, values)
+        empty = count == 0
+        low[empty] = numpy.nan
+        high[empty] = numpy.nan
+        mean = numpy.where(empty, numpy.nan, total / numpy.where(empty, 1, count))
+        rows = numpy.column_stack((low, high, mean, count))
+        self.buffer[:] = rows[:-1]
+        self.head = 0
+        self.count = int(min(self.capacity, last - indices[0]))
+        self.index = int(last)
+        self.total = float(total[-1])
+        self.number = int(count[-1])
+        self.low = low[-1]
+        self.high = high[-1]
+
+    def latest(self, seconds: int):
+        length = min((seconds // self.step), self.count)
+        start = (self.head - length) % self.capacity
+        indices = (start + numpy.arange(length)) % self.capacity
+        rows = numpy.concatenate((self.buffer[indices], [self.current]))
+        x = numpy.arange(len(rows) - 1, -1, -1) * self.step * -1
+        return x, rows
+
+    def extrema(self, seconds: int):
+        _, rows = self.latest(seconds)
+        rows = rows[~numpy.isnan(rows[:, 0])]
+        if len(rows) == 0:
+            return numpy.nan, numpy.nan
+        return rows[:, 0].min(), rows[:, 1].max()
+
+
 class DataStream:
 
-    def __init__(self, initial: float = 0, interval: int = 1):
-        self.interval = interval
-        self.stack = collections.deque()
+    scheduler = Scheduler()
+    reducers = {
+        "last": lambda x: x[-1] if len(x) > 0 else numpy.nan,
+        "mean": lambda x: sum(x) / len(x) if len(x) > 0 else numpy.nan,
+        "min": lambda x: min(x) if len(x) > 0 else numpy.nan,
+        "max": lambda x: max(x) if len(x) > 0 else numpy.nan,
+        "count": lambda x: len(x)
+    }
+
+    def __init__(self, initial: float = 0, interval: int = 1, seconds: int = 100, retention: int = None, reducer: str = "last", tiers: list = None, group=None):
+        self._interval = interval
+        self.reducer = reducer
+        self.tiers = [Tier(*x) for x in sorted(tiers or list())]
+        self.seconds = seconds
+        self.retention = retention
+        self.buffer = numpy.empty(0, dtype=float)
+        self.head = 0
+        self.count = 0
+        self.demand = 0
+        self.group = None
+        self.column = None
+        self.length = 0
+        self.sequence = 0
+        self.timestamp = time.time()
+        self.minimums = collections.deque()
+        self.maximums = collections.deque()
+        self.block = 0
+        self.summaries = numpy.empty((0, 2), dtype=float)
+        self.positions = numpy.empty((0, 2), dtype=numpy.int64)
         self.reserved = collections.deque()
-        self.reserved.append(initial)
+        self.reserved.append((time.time(), initial))
+        self.observers = list()
         self.lock = threading.Lock()
-        thread = threading.Thread(target=self.update, daemon=True)
-        thread.start()
+        self.resize()
+        self.update()
+        if group is None:
+            self.scheduler.register(self)
+        else:
+            group.add(self)
+
+    @property
+    def interval(self) -> int:
+        int_ = self._interval
+        return int_
+
+    @interval.setter
+    def interval(self, interval: int):
+        if interval == self._interval:
+            return
+        registered = self.group is not None
+        if registered:
+            self.group.remove(self)
+        registered = self.scheduler.unregister(self) or registered
+        self._interval = interval
+        self.resize()
+        if registered:
+            self.scheduler.register(self)
+
+    @property
+    def capacity(self) -> int:
+        int_ = len(self.buffer)
+        return int_
+
+    @property
+    def retained(self) -> int:
+        int_ = max([(self.capacity - 1) * self.interval] + [x.seconds for x in self.tiers])
+        return int_
+
+    def resize(self, seconds: int = None):
+        with self.lock:
+            seconds = self.seconds if seconds is None else seconds
+            retention = seconds if self.retention is None else self.retention
+            if not any([x.seconds >= seconds for x in self.tiers]):
+                retention = max(retention, seconds)
+            capacity = (retention // self.interval) + 1
+            previous = (self.seconds, self.demand)
+            group = self.group
+            if (group is None) and (capacity != self.capacity):
+                count = min(self.count, capacity)
+                buffer = numpy.full(capacity, numpy.nan)
+                buffer[:count] = self.window(count)
+                self.buffer = buffer
+                self.head = count % capacity
+                self.count = count
+                self.block = 0
+            self.seconds = seconds
+            self.demand = capacity
+        if group is not None:
+            try:
+                group.resize()
+            except:
+                with self.lock:
+                    self.seconds, self.demand = previous
+                raise
+        with self.lock:
+            length = (self.seconds // self.interval) + 1
+            if length != self.length:
+                self.length = length
+                self.rebuild()
+
+    def set_tiers(self, tiers: list = None):
+        with self.lock:
+            self.tiers = [Tier(*x) for x in sorted(tiers or list())]
+        self.resize()
+
+    def select(self, seconds: int, points: int):
+        if len(self.tiers) == 0:
+            return None
+        candidates = [(self.interval, (self.capacity - 1) * self.interval, None)]
+        candidates += [(x.step, x.seconds, x) for x in self.tiers]
+        covering = [x for x in candidates if x[1] >= seconds]
+        covering = covering if len(covering) > 0 else [max(candidates, key=lambda x: x[1])]
+        satisfying = [x for x in covering if (seconds // x[0]) >= points]
+        selected = max(satisfying, key=lambda x: x[0]) if len(satisfying) > 0 else min(covering, key=lambda x: x[0])
+        return selected[2]
+
+    def rollup(self, seconds: int, points: int):
+        with self.lock:
+            tier = self.select(seconds, points)
+            if tier is None:
+                return None, None, None
+            x, rows = tier.latest(seconds)
+        return tier.step, x, rows
+
+    def rebuild(self):
+        self.minimums.clear()
+        self.maximums.clear()
+        window = self.window(self.length)
+        first = self.sequence - len(window)
+        for index, value in enumerate(window):
+            self.track(first + index, value)
+
+    def summarize(self, block: int):
+        size = (self.capacity // block) + 2
+        self.block = block
+        self.summaries = numpy.full((size, 2), numpy.nan)
+        self.positions = numpy.zeros((size, 2), dtype=numpy.int64)
+        window = self.window(self.count)
+        first = self.sequence - len(window)
+        start = first - first % block
+        values = numpy.concatenate((numpy.full(first - start, numpy.nan), window))
+        values = numpy.concatenate((values, numpy.full(-len(values) % block, numpy.nan))).reshape(-1, block)
+        low = numpy.where(numpy.isnan(values), numpy.inf, values).argmin(axis=1)
+        high = numpy.where(numpy.isnan(values), -numpy.inf, values).argmax(axis=1)
+        rows = numpy.arange(len(values))
+        indices = ((start // block) + rows) % size
+        self.summaries[indices, 0] = values[rows, low]
+        self.summaries[indices, 1] = values[rows, high]
+        self.positions[indices, 0] = start + rows * block + low
+        self.positions[indices, 1] = start + rows * block + high
+
+    def summary(self, sequence: int, value: float):
+        index = (sequence // self.block) % len(self.summaries)
+        if sequence % self.block == 0:
+            self.summaries[index] = value
+            self.positions[index] = sequence
+            return
+        if numpy.isnan(value):
+            return
+        if not value >= self.summaries[index, 0]:
+            self.summaries[index, 0] = value
+            self.positions[index, 0] = sequence
+        if not value <= self.summaries[index, 1]:
+            self.summaries[index, 1] = value
+            self.positions[index, 1] = sequence
+
+    def track(self, sequence: int, value: float):
+        if not numpy.isnan(value):
+            while len(self.minimums) > 0 and self.minimums[-1][1] >= value:
+                self.minimums.pop()
+            self.minimums.append((sequence, value))
+            while len(self.maximums) > 0 and self.maximums[-1][1] <= value:
+                self.maximums.pop()
+            self.maximums.append((sequence, value))
+        expired = sequence - self.length
+        while len(self.minimums) > 0 and self.minimums[0][0] <= expired:
+            self.minimums.popleft()
+        while len(self.maximums) > 0 and self.maximums[0][0] <= expired:
+            self.maximums.popleft()
+
+    def window(self, length: int):
+        length = min(length, self.count)
+        start = (self.head - length) % self.capacity if self.capacity > 0 else 0
+        stop = start + length
+        if stop <= self.capacity:
+            return self.buffer[start:stop]
+        return numpy.concatenate((self.buffer[start:], self.buffer[:stop - self.capacity]))
+
+    def reduce(self, samples: list):
+        samples = sorted(samples, key=lambda x: x[0])
+        values = [x[1] for x in samples if x[1] is not None]
+        value = float(self.reducers[self.reducer](values))
+        return value
+
+    def collect(self, now: float):
+        if len(self.reserved) == 0:
+            return 0.0 if self.reducer == "count" else numpy.nan
+        samples = [x for x in self.reserved if x[0] <= now]
+        if len(samples) < len(self.reserved):
+            self.reserved = collections.deque([x for x in self.reserved if x[0] > now])
+        else:
+            self.reserved.clear()
+        value = self.reduce(samples)
+        return value
+
+    def commit(self, now: float, value: float, head: int):
+        self.head = head
+        self.timestamp = now
+        self.count = min(self.count + 1, self.capacity)
+        self.track(self.sequence, value)
+        if self.block > 0:
+            self.summary(self.sequence, value)
+        for tier in self.tiers:
+            tier.add(now, value)
+        self.sequence += 1
+
+    def notify(self, now: float, value: float):
+        for observer in self.observers:
+            observer(now, value)
 
     def update(self):
-        basetime = time.time()
-        while True:
-            value = self.reserved.popleft() if len(self.reserved) > 0 else None
-            self.stack.append(value)
-            elapsed = time.time() - basetime
-            seconds = elapsed + (self.interval - elapsed % self.interval)
-            basetime += seconds
-            while time.time() < basetime:
-                time.sleep(0.1)
+        now = time.time()
+        with self.lock:
+            value = self.collect(now)
+            self.buffer[self.head] = value
+            self.commit(now, value, (self.head + 1) % self.capacity)
+        self.notify(now, value)
+
+    def close(self):
+        if self.group is not None:
+            self.group.remove(self)
+        self.scheduler.unregister(self)
 
-    def append(self, value: float):
+    def restore(self, timestamps: numpy.ndarray, values: numpy.ndarray):
         with self.lock:
-            self.reserved.append(value)
+            missing = int((time.time() - timestamps[-1]) // self.interval) if len(timestamps) > 0 else 0
+            window = numpy.concatenate((values, numpy.full(min(max(missing, 0), self.capacity), numpy.nan)))
+            window = window[-self.capacity:]
+            self.buffer.fill(numpy.nan)
+            self.buffer[(self.head - len(window) + numpy.arange(len(window))) % self.capacity] = window
+            self.count = len(window)
+            self.sequence = len(window)
+            self.timestamp = time.time()
+            self.block = 0
+            self.rebuild()
+            for tier in self.tiers:
+                tier.restore(timestamps, values)
+
+    def append(self, value: float, timestamp: float = None):
+        now = time.time()
+        timestamp = now if timestamp is None else min(timestamp, now + self.interval)
+        with self.lock:
+            self.reserved.append((timestamp, value))
+
+    def extend(self, values: list, timestamps: list = None):
+        now = time.time()
+        if timestamps is None:
+            timestamps = [now] * len(values)
+        else:
+            timestamps = [min(x, now + self.interval) for x in timestamps]
+        with self.lock:
+            self.reserved.extend(zip(timestamps, values))
 
     def clear(self):
         with self.lock:
             self.reserved.clear()
-            self.stack.clear()
+            self.buffer.fill(numpy.nan)
+            self.count = 0
+            self.minimums.clear()
+            self.maximums.clear()
+            self.block = 0
+            for tier in self.tiers:
+                tier.clear()
 
     def latest(self, seconds: int = 1):
+        length = (seconds // self.interval) + 1
+        start = (length - 1) * self.interval * -1
+        x = numpy.arange(start, 1, self.interval)
+        with self.lock:
+            y = self.window(length).copy()
+            deficient = length - len(y)
+            if deficient > 0:
+                padding = y[0] if len(y) > 0 else 0
+                y = numpy.concatenate((numpy.full(deficient, padding), y))
+        return x, y
+
+    def decimate(self, seconds: int, width: int):
+        length = (seconds // self.interval) + 1
+        block = 2 ** int(math.log2(max(1, length // max(1, width))))
+        with self.lock:
+            tier = self.select(seconds, width)
+            if tier is not None:
+                x, rows = tier.latest(seconds)
+                return numpy.repeat(x, 2), rows[:, :2].ravel()
+        if block < 2:
+            return self.latest(seconds)
+        with self.lock:
+            if block != self.block:
+                self.summarize(block)
+            window = self.window(length)
+            y = window
+            last = self.sequence
+            first = last - len(y)
+            head = min(-(-first // block) * block, last)
+            tail = max(last - (last % block or block), head)
+            indices = numpy.arange(head // block, tail // block) % len(self.summaries)
+            summaries = self.summaries[indices]
+            positions = self.positions[indices]
+            swap = positions[:, 0] > positions[:, 1]
+            bx = numpy.where(swap[:, None], positions[:, ::-1], positions).ravel()
+            by = numpy.where(swap[:, None], summaries[:, ::-1], summaries).ravel()
+            x = numpy.concatenate((numpy.arange(first, head), bx, numpy.arange(tail, last)))
+            y = numpy.concatenate((y[:head - first], by, y[len(y) - (last - tail):]))
+            deficient = length - (last - first)
+            if deficient > 0:
+                padding = window[0] if len(window) > 0 else 0
+                x = numpy.concatenate((numpy.unique([first - deficient, first - 1]), x))
+                y = numpy.concatenate((numpy.full(len(x) - len(y), padding), y))
+        x = (x - (last - 1)) * self.interval
+        return x, y
+
+    def extrema(self, seconds: int = None, points: int = None):
+        with self.lock:
+            tier = self.select(seconds, points) if seconds is not None else None
+            if tier is not None:
+                return tier.extrema(seconds)
+            if self.count == 0:
+                return 0.0, 0.0
+            min_value = self.minimums[0][1] if len(self.minimums) > 0 else numpy.nan
+            max_value = self.maximums[0][1] if len(self.maximums) > 0 else numpy.nan
+        return min_value, max_value
+
+
+class DataStreamGroup:
+
+    shared = False
+
+    def __init__(self, interval: int = 1, scheduled: bool = True):
+        self.interval = interval
+        self.scheduled = scheduled
+        self.members = list()
+        self.buffer = numpy.empty((0, 0), dtype=float)
+        self.head = 0
+        self.memory = None
+        self.header = None
+        self.retired = list()
+        self.lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        int_ = len(self.buffer)
+        return int_
+
+    @contextlib.contextmanager
+    def acquire(self, members: list):
+        for member in members:
+            member.lock.acquire()
+        try:
+            yield
+        finally:
+            for member in members:
+                member.lock.release()
+
+    def allocate(self, capacity: int, columns: int):
+        if not self.shared:
+            return None, None, numpy.full((capacity, columns), numpy.nan)
+        memory = multiprocessing.shared_memory.SharedMemory(create=True, size=(4 + columns + capacity * columns) * 8)
+        header = numpy.ndarray(4 + columns, dtype=numpy.int64, buffer=memory.buf)
+        header[:] = 0
+        header[2:4] = (capacity, columns)
+        buffer = numpy.ndarray((capacity, columns), dtype=float, buffer=memory.buf, offset=(4 + columns) * 8)
+        buffer.fill(numpy.nan)
+        return memory, header, buffer
+
+    def release(self):
+        if self.memory is not None:
+            self.memory.unlink()
+            self.retired.append(self.memory)
+        self.memory = None
+        self.header = None
+        for memory in list(self.retired):
+            try:
+                memory.close()
+                self.retired.remove(memory)
+            except BufferError:
+                pass
+
+    def publish(self):
+        if self.header is None:
+            return
+        self.header[1] = self.head
+        self.header[4:] = [x.count for x in self.members]
+        self.header[0] += 2 - self.header[0] % 2
+
+    def layout(self, members: list):
+        capacity = max([x.demand for x in members] + [1])
+        memory, header, buffer = self.allocate(capacity, len(members))
+        for index, member in enumerate(members):
+            window = member.window(min(member.count, capacity))
+            buffer[capacity - len(window):, index] = window
+            member.count = len(window)
+        for index, member in enumerate(members):
+            member.buffer = buffer[:, index]
+            member.column = index
+            member.head = 0
+            member.block = 0
+        self.buffer = buffer
+        self.head = 0
+        self.members = members
+        self.release()
+        self.memory = memory
+        self.header = header
+        self.publish()
+
+    def add(self, stream: DataStream):
+        DataStream.scheduler.unregister(stream)
         with self.lock:
-            list_ = list(self.stack)
+            members = self.members + [stream]
+            with self.acquire(members):
+                self.layout(members)
+                stream.group = self
+        if (len(members) == 1) and self.scheduled:
+            DataStream.scheduler.register(self)
+
+    def remove(self, stream: DataStream):
+        with self.lock:
+            with self.acquire(self.members):
+                count = min(stream.count, stream.demand)
+                buffer = numpy.full(stream.demand, numpy.nan)
+                buffer[:count] = stream.window(count)
+                stream.buffer = buffer
+                stream.head = count % stream.demand
+                stream.count = count
+                stream.block = 0
+                stream.group = None
+                members = [x for x in self.members if x is not stream]
+                self.layout(members)
+        if len(members) == 0:
+            DataStream.scheduler.unregister(self)
+            with self.lock:
+                self.release()
+
+    def resize(self):
+        with self.lock:
+            with self.acquire(self.members):
+                if max([x.demand for x in self.members] + [1]) != self.capacity:
+                    self.layout(self.members)
+
+    def update(self):
+        now = time.time()
+        with self.lock:
+            members = self.members
+            values = list()
+            with self.acquire(members):
+                for member in members:
+                    values.append(member.collect(now))
+                if self.header is not None:
+                    self.header[0] += 1
+                self.buffer[self.head] = values
+                self.head = (self.head + 1) % self.capacity
+                for member, value in zip(members, values):
+                    member.commit(now, value, self.head)
+                self.publish()
+        for member, value in zip(members, values):
+            member.notify(now, value)
+
+    def latest(self, seconds: int = 1):
         length = (seconds // self.interval) + 1
         start = (length - 1) * self.interval * -1
-        padding = self.stack[0] if len(self.stack) > 0 else 0
-        deficient = length - len(list_)
-        list_ = [padding] * deficient + list_
         x = numpy.arange(start, 1, self.interval)
-        y = numpy.asarray(list_[length * -1:], dtype=float)
+        with self.lock:
+            members = self.members
+            with self.acquire(members):
+                available = min(length, self.capacity)
+                indices = (self.head - available + numpy.arange(available)) % self.capacity
+                y = numpy.full((length, len(members)), numpy.nan)
+                y[length - available:] = self.buffer[indices]
+                counts = numpy.array([min(x.count, length) for x in members], dtype=numpy.int64)
+        deficient = length - counts
+        columns = numpy.arange(len(members))
+        padding = numpy.where(counts > 0, y[numpy.minimum(deficient, length - 1), columns], 0)
+        y = numpy.where(numpy.arange(length)[:, None] < deficient, padding, y)
+        return x, y, members
+
+    def decimate(self, seconds: int, width: int):
+        length = (seconds // self.interval) + 1
+        if length // max(1, width) >= 2:
+            return dict()
+        x, y, members = self.latest(seconds)
+        dict_ = {member: (x, y[:, index]) for index, member in enumerate(members) if len(member.tiers) == 0}
+        return dict_
+
+
+class Constant:
+
+    def __init__(self, value: float):
+        self.value = float(value)
+
+    def step(self):
+        float_ = self.value
+        return float_
+
+
+class Source:
+
+    def __init__(self, stream: DataStream):
+        self.stream = stream
+
+    def step(self):
+        with self.stream.lock:
+            window = self.stream.window(1)
+        float_ = float(window[0]) if len(window) > 0 else numpy.nan
+        return float_
+
+
+class Combination:
+
+    operators = {
+        "add": operator.add,
+        "sub": operator.sub,
+        "mul": operator.mul,
+        "div": lambda x, y: x / y if y != 0 else numpy.nan
+    }
+
+    def __init__(self, name: str, children: list):
+        self.function = self.operators[name]
+        self.children = children
+
+    def step(self):
+        values = [x.step() for x in self.children]
+        float_ = functools.reduce(self.function, values)
+        return float_
+
+
+class Rolling:
+
+    def __init__(self, name: str, size: int, child):
+        self.name = name
+        self.size = size
+        self.child = child
+        self.values = collections.deque()
+        self.sequence = 0
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimums = collections.deque()
+        self.maximums = collections.deque()
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        while len(self.minimums) > 0 and self.minimums[-1][1] >= value:
+            self.minimums.pop()
+        self.minimums.append((self.sequence, value))
+        while len(self.maximums) > 0 and self.maximums[-1][1] <= value:
+            self.maximums.pop()
+        self.maximums.append((self.sequence, value))
+
+    def discard(self, value: float):
+        self.count -= 1
+        if self.count == 0:
+            self.mean = 0.0
+            self.m2 = 0.0
+            return
+        delta = value - self.mean
+        self.mean -= delta / self.count
+        self.m2 -= delta * (value - self.mean)
+
+    def step(self):
+        value = self.child.step()
+        self.values.append(value)
+        if not numpy.isnan(value):
+            self.add(value)
+        if len(self.values) > self.size:
+            expired = self.values.popleft()
+            if not numpy.isnan(expired):
+                self.discard(expired)
+        expired = self.sequence - self.size
+        while len(self.minimums) > 0 and self.minimums[0][0] <= expired:
+            self.minimums.popleft()
+        while len(self.maximums) > 0 and self.maximums[0][0] <= expired:
+            self.maximums.popleft()
+        self.sequence += 1
+        if self.count == 0:
+            return numpy.nan
+        if self.name == "mean":
+            return self.mean
+        if self.name == "sum":
+            return self.mean * self.count
+        if self.name == "std":
+            return math.sqrt(max(self.m2 / self.count, 0.0))
+        if self.name == "min":
+            return self.minimums[0][1]
+        return self.maximums[0][1]
+
+
+class Difference:
+
+    def __init__(self, child, interval: int = None):
+        self.child = child
+        self.interval = interval
+        self.previous = numpy.nan
+
+    def step(self):
+        value = self.child.step()
+        float_ = value - self.previous
+        self.previous = value
+        float_ = float_ / self.interval if self.interval is not None else float_
+        return float_
+
+
+class Smoothing:
+
+    def __init__(self, alpha: float, child):
+        self.alpha = alpha
+        self.child = child
+        self.value = numpy.nan
+
+    def step(self):
+        value = self.child.step()
+        if numpy.isnan(self.value):
+            self.value = value
+        elif not numpy.isnan(value):
+            self.value += self.alpha * (value - self.value)
+        float_ = self.value
+        return float_
+
+
+class Expression:
+
+    windows = ("mean", "sum", "std", "min", "max")
+
+    def __init__(self, tree, streams: dict):
+        self.tree = tree
+        self.streams = streams
+        self.sources = list()
+        self.primary = None
+        for reference in self.references(tree):
+            self.primary = self.stream(reference)
+            break
+        if self.primary is None:
+            raise ValueError("expression references no line")
+        self.root = self.parse(tree)
+
+    def references(self, tree):
+        if isinstance(tree, dict):
+            if "line" in tree:
+                yield tree["line"]
+            for value in tree.values():
+                for child in value if isinstance(value, list) else [value]:
+                    yield from self.references(child)
+
+    def stream(self, reference: str) -> DataStream:
+        stream = self.streams.get(uuid.UUID(str(reference)))
+        if stream is None:
+            raise ValueError(f"unknown line: {reference}")
+        return stream
+
+    def parse(self, tree):
+        if isinstance(tree, (int, float)) and not isinstance(tree, bool):
+            return Constant(tree)
+        if not isinstance(tree, dict):
+            raise ValueError(f"invalid expression: {tree!r}")
+        if "line" in tree:
+            stream = self.stream(tree["line"])
+            if stream not in self.sources:
+                self.sources.append(stream)
+            return Source(stream)
+        name = tree.get("op")
+        if name in Combination.operators:
+            children = tree.get("args")
+            if not isinstance(children, list) or len(children) < 2:
+                raise ValueError(f"{name} requires two or more args")
+            return Combination(name, [self.parse(x) for x in children])
+        if name in self.windows:
+            window = tree.get("window")
+            if not isinstance(window, (int, float)) or not window > 0:
+                raise ValueError(f"{name} requires a positive window")
+            size = max(1, int(window // self.primary.interval))
+            return Rolling(name, size, self.parse(tree.get("of")))
+        if name in ("diff", "rate"):
+            interval = self.primary.interval if name == "rate" else None
+            return Difference(self.parse(tree.get("of")), interval)
+        if name == "ewma":
+            alpha = tree.get("alpha")
+            if not isinstance(alpha, (int, float)) or not 0 < alpha <= 1:
+                raise ValueError("ewma requires 0 < alpha <= 1")
+            return Smoothing(float(alpha), self.parse(tree.get("of")))
+        raise ValueError(f"unknown operator: {name}")
+
+    def step(self):
+        float_ = float(self.root.step())
+        return float_
+
+
+class DerivedStream(DataStream):
+
+    def __init__(self, expression: Expression, seconds: int = 100, retention: int = None, tiers: list = None, group: DataStreamGroup = None):
+        self.expression = expression
+        self.pending = numpy.nan
+        super().__init__(numpy.nan, expression.primary.interval, seconds, retention, "last", tiers, group)
+        if group is None:
+            self.scheduler.unregister(self)
+        self.reserved.clear()
+        expression.primary.observers.append(self.tick)
+
+    def collect(self, now: float):
+        value = self.pending
+        self.pending = numpy.nan
+        return value
+
+    def tick(self, now: float, value: float):
+        value = self.expression.step()
+        with self.lock:
+            self.pending = value
+        if self.group is None:
+            self.update()
+        else:
+            self.group.update()
+
+    def close(self):
+        primary = self.expression.primary
+        primary.observers = [x for x in primary.observers if x != self.tick]
+        super().close()
+
+    def append(self, value: float, timestamp: float = None):
+        pass
+
+    def extend(self, values: list, timestamps: list = None):
+        pass
+
+
+class SharedBuffer:
+
+    def __init__(self, name: str):
+        self.name = name
+        self.memory = multiprocessing.shared_memory.SharedMemory(name=name)
+        columns = int(numpy.ndarray(4, dtype=numpy.int64, buffer=self.memory.buf)[3])
+        self.header = numpy.ndarray(4 + columns, dtype=numpy.int64, buffer=self.memory.buf)
+        self.buffer = numpy.ndarray((int(self.header[2]), columns), dtype=float, buffer=self.memory.buf, offset=(4 + columns) * 8)
+        self.references = 0
+
+    @property
+    def sequence(self) -> int:
+        int_ = int(self.header[0])
+        return int_
+
+    def snapshot(self, column: int, length: int):
+        capacity = len(self.buffer)
+        head = int(self.header[1])
+        available = max(min(length, int(self.header[4 + column]), capacity), 0)
+        y = self.buffer[(head - available + numpy.arange(available)) % capacity, column]
+        return y
+
+    def read(self, column: int, length: int):
+        for attempt in range(16):
+            sequence = self.sequence
+            y = self.snapshot(column, length)
+            if (sequence % 2 == 0) and (self.sequence == sequence):
+                return y
+            time.sleep(0 if attempt < 8 else 0.001)
+        return y
+
+    def close(self):
+        self.header = None
+        self.buffer = None
+        self.memory.close()
+
+
+class SharedStream:
+
+    def __init__(self, panel: uuid.UUID, interval: int = 1):
+        self.panel = panel
+        self.interval = interval
+        self.group = None
+        self.source = None
+        self.column = 0
+
+    def bind(self, source: SharedBuffer, column: int):
+        self.source = source
+        self.column = column
+
+    def window(self, length: int):
+        if self.source is None:
+            return numpy.empty(0, dtype=float)
+        y = self.source.read(self.column, length)
+        return y
+
+    def latest(self, seconds: int = 1):
+        length = (seconds // self.interval) + 1
+        start = (length - 1) * self.interval * -1
+        x = numpy.arange(start, 1, self.interval)
+        y = self.window(length)
+        deficient = length - len(y)
+        if deficient > 0:
+            padding = y[0] if len(y) > 0 else 0
+            y = numpy.concatenate((numpy.full(deficient, padding), y))
         return x, y
 
+    def decimate(self, seconds: int, width: int):
+        length = (seconds // self.interval) + 1
+        block = 2 ** int(math.log2(max(1, length // max(1, width))))
+        y = self.window(length)
+        if (block < 2) or (len(y) == 0):
+            return self.latest(seconds)
+        x = numpy.arange(1 - len(y), 1) * self.interval
+        rest = len(y) % block
+        values = y[rest:].reshape(-1, block)
+        low = numpy.where(numpy.isnan(values), numpy.inf, values).argmin(axis=1)
+        high = numpy.where(numpy.isnan(values), -numpy.inf, values).argmax(axis=1)
+        rows = numpy.arange(len(values)) * block + rest
+        indices = numpy.column_stack((rows + numpy.minimum(low, high), rows + numpy.maximum(low, high))).ravel()
+        indices = numpy.concatenate((numpy.arange(rest), indices))
+        return x[indices], y[indices]
+
+    def extrema(self, seconds: int = None, points: int = None):
+        y = self.window(((seconds or 0) // self.interval) + 1)
+        if len(y) == 0:
+            return 0.0, 0.0
+        y = y[~numpy.isnan(y)]
+        if len(y) == 0:
+            return numpy.nan, numpy.nan
+        return y.min(), y.max()
+
+
+class Registry:
+
+    def __init__(self):
+        self.axes = dict()
+        self.lines = dict()
+        self.lock = threading.Lock()
+
+    def add_axes(self, axes: matplotlib.pyplot.Axes):
+        with self.lock:
+            self.axes[axes.id] = axes
+
+    def remove_axes(self, uuid4: uuid.UUID):
+        with self.lock:
+            axes = self.axes.pop(uuid4, None)
+            lines = list() if axes is None else axes.lines
+            for line in lines:
+                self.lines.pop(line.id, None)
+
+    def add_line(self, line: matplotlib.lines.Line2D):
+        with self.lock:
+            self.lines[line.id] = line
+
+    def remove_line(self, uuid4: uuid.UUID):
+        with self.lock:
+            self.lines.pop(uuid4, None)
+
+
+class SeriesFile:
+
+    size = 65536
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        if not os.path.exists(path):
+            with open(path, "wb") as file:
+                file.truncate((self.size + 1) * 16)
+        self.records = numpy.memmap(path, dtype="<f8", mode="r+").reshape(-1, 2)
+        self.count = int(self.records[0, 0])
+
+    def grow(self):
+        length = len(self.records) + self.size
+        self.records.flush()
+        del self.records
+        with open(self.path, "r+b") as file:
+            file.truncate(length * 16)
+        self.records = numpy.memmap(self.path, dtype="<f8", mode="r+").reshape(-1, 2)
+
+    def append(self, timestamp: float, value: float):
+        with self.lock:
+            if self.records is None:
+                return
+            if self.count + 1 >= len(self.records):
+                self.grow()
+            self.records[self.count + 1] = (timestamp, value)
+            self.count += 1
+            self.records[0, 0] = self.count
+
+    def latest(self, length: int):
+        with self.lock:
+            if self.records is None:
+                return numpy.empty(0), numpy.empty(0)
+            start = max(0, self.count - length) + 1
+            records = numpy.array(self.records[start:self.count + 1])
+        return records[:, 0], records[:, 1]
+
+    def flush(self):
+        with self.lock:
+            if self.records is not None:
+                self.records.flush()
+
+    def close(self):
+        with self.lock:
+            if self.records is not None:
+                self.records.flush()
+            self.records = None
+
+
+class Store:
+
+    def __init__(self, path: str, sync: float = 1.0):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.sync = sync
+        self.series = dict()
+        self.lock = threading.Lock()
+        self.mutex = threading.Lock()
+        self.revision = None
+        self.thread = None
+
+    @property
+    def manifest(self) -> str:
+        str_ = os.path.join(self.path, "layout.json")
+        return str_
+
+    def load(self):
+        if not os.path.exists(self.manifest):
+            return {"axes": list()}
+        with open(self.manifest, encoding="utf-8") as file:
+            dict_ = json.load(file)
+        return dict_
+
+    def save(self, layout: dict):
+        path = self.manifest + ".tmp"
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(layout, file, ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path, self.manifest)
+
+    def attach(self, uuid4: uuid.UUID, data: DataStream):
+        series = SeriesFile(os.path.join(self.path, f"{uuid4}.bin"))
+        length = max([data.capacity] + [(x.seconds // data.interval) + 1 for x in data.tiers])
+        timestamps, values = series.latest(length)
+        if len(timestamps) > 0:
+            data.restore(timestamps, values)
+        data.observers.append(series.append)
+        with self.lock:
+            self.series[uuid4] = series
+
+    def detach(self, uuid4: uuid.UUID, data: DataStream = None):
+        with self.lock:
+            series = self.series.pop(uuid4, None)
+        if series is None:
+            return
+        if data is not None:
+            data.observers = [x for x in data.observers if x != series.append]
+        series.close()
+        os.remove(series.path)
+
+    def flush(self, scene):
+        with self.mutex:
+            with self.lock:
+                list_ = list(self.series.values())
+            for series in list_:
+                series.flush()
+            if scene.revision != self.revision:
+                self.revision = scene.revision
+                self.save(scene.describe())
+
+    def start(self, scene):
+        def run():
+            while True:
+                time.sleep(self.sync)
+                self.flush(scene)
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+
+
+class Subscriber:
+
+    def __init__(self, keys: set = None, size: int = 256):
+        self.keys = keys
+        self.queue = collections.deque(maxlen=size)
+        self.condition = threading.Condition()
+        self.dropped = 0
+
+    def put(self, message: str):
+        with self.condition:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(message)
+            self.condition.notify()
+
+    def get(self, timeout: float = None):
+        with self.condition:
+            if len(self.queue) == 0:
+                self.condition.wait(timeout)
+            list_ = list(self.queue)
+            self.queue.clear()
+        return list_
+
+
+class Broadcaster:
+
+    def __init__(self, limit: int = None):
+        self.subscribers = list()
+        self.limit = limit
+        self.lock = threading.Lock()
+
+    def subscribe(self, keys: set = None, size: int = 256):
+        subscriber = Subscriber(keys, size)
+        with self.lock:
+            if (self.limit is not None) and (len(self.subscribers) >= self.limit):
+                return None
+            self.subscribers = self.subscribers + [subscriber]
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self.lock:
+            self.subscribers = [x for x in self.subscribers if x is not subscriber]
+
+    def notify(self, axes: uuid.UUID, line: uuid.UUID, timestamp: float, value: float):
+        subscribers = self.subscribers
+        if len(subscribers) == 0:
+            return
+        dict_ = {
+            "axes": str(axes),
+            "line": str(line),
+            "value": None if numpy.isnan(value) else value,
+            "timestamp": timestamp
+        }
+        message = f"data: {json.dumps(dict_)}\n\n"
+        keys = {axes, line}
+        for subscriber in subscribers:
+            if subscriber.keys is None or len(subscriber.keys & keys) > 0:
+                subscriber.put(message)
+
+
+class Panel:
+
+    __slots__ = ("id", "title", "unit", "seconds", "retention", "bottom", "top", "series", "groups")
+
+    def __init__(self, uuid4: uuid.UUID):
+        self.id = uuid4
+        self.title = None
+        self.unit = None
+        self.seconds = 100
+        self.retention = None
+        self.bottom = None
+        self.top = None
+        self.series = dict()
+        self.groups = dict()
+
+    def group(self, interval: int):
+        group = self.groups.get(interval)
+        if group is None:
+            group = DataStreamGroup(interval)
+            self.groups[interval] = group
+        return group
+
+    def prune(self):
+        for interval, group in list(self.groups.items()):
+            if len(group.members) == 0:
+                del self.groups[interval]
+
+
+class Series:
+
+    __slots__ = ("id", "panel", "label", "data")
+
+    def __init__(self, uuid4: uuid.UUID, panel: Panel, label: str, data: DataStream):
+        self.id = uuid4
+        self.panel = panel
+        self.label = label
+        self.data = data
+
+    @property
+    def interval(self) -> int:
+        int_ = self.data.interval
+        return int_
+
+    @property
+    def reducer(self) -> str:
+        str_ = self.data.reducer
+        return str_
+
+    @property
+    def tiers(self) -> list:
+        list_ = [(x.step, x.seconds) for x in self.data.tiers]
+        return list_
+
+    @property
+    def expression(self):
+        tree = self.data.expression.tree if isinstance(self.data, DerivedStream) else None
+        return tree
+
+
+class Scene:
+
+    def __init__(self, broadcaster: Broadcaster = None, queue: bool = True):
+        self.panels = dict()
+        self.series = dict()
+        self.commands = collections.deque(maxlen=None if queue else 0)
+        self.broadcaster = Broadcaster() if broadcaster is None else broadcaster
+        self.store = None
+        self.revision = 0
+        self.lock = threading.RLock()
+
+    def submit(self, name: str, uuid4: uuid.UUID, **kwargs):
+        self.commands.append((name, uuid4, kwargs))
+        self.revision += 1
+
+    def drain(self):
+        with self.lock:
+            list_ = list(self.commands)
+            self.commands.clear()
+        return list_
+
+    def add_panel(self, title: str = None, unit: str = None, seconds: int = 100, retention: int = None, bottom: float = None, top: float = None, uuid4: uuid.UUID = None):
+        with self.lock:
+            panel = Panel(uuid.uuid4() if uuid4 is None else uuid4)
+            self.panels[panel.id] = panel
+            self.update_panel(panel, title, unit, seconds, retention, bottom, top)
+        return panel
+
+    def update_panel(self, panel: Panel, title: str = None, unit: str = None, seconds: int = 100, retention: int = None, bottom: float = None, top: float = None):
+        with self.lock:
+            if panel.id not in self.panels:
+                return None
+            resized = list()
+            try:
+                for series in panel.series.values():
+                    resized.append((series, series.data.retention))
+                    series.data.retention = retention
+                    series.data.resize(seconds)
+            except:
+                for series, previous in resized:
+                    series.data.retention = previous
+                    series.data.resize(panel.seconds)
+                raise
+            panel.title = title
+            panel.unit = unit
+            panel.seconds = seconds
+            panel.retention = retention
+            panel.bottom = bottom
+            panel.top = top
+            self.submit("panel", panel.id, title=title, unit=unit, seconds=seconds, bottom=bottom, top=top)
+        return panel
+
+    def remove_panel(self, panel: Panel):
+        with self.lock:
+            if panel.id not in self.panels:
+                return None
+            for series in list(panel.series.values()):
+                self.close(series)
+            self.panels.pop(panel.id, None)
+            self.submit("remove_panel", panel.id)
+        return panel
+
+    def add_series(self, panel: Panel, label: str = None, interval: int = 1, reducer: str = "last", tiers: list = None, uuid4: uuid.UUID = None):
+        with self.lock:
+            if panel.id not in self.panels:
+                return None
+            data = DataStream(interval=interval, seconds=panel.seconds, retention=panel.retention, reducer=reducer, tiers=tiers, group=panel.group(interval))
+            series = self.insert(panel, label, data, uuid4)
+        return series
+
+    def add_derived(self, panel: Panel, label: str = None, expression=None, tiers: list = None, uuid4: uuid.UUID = None):
+        with self.lock:
+            if panel.id not in self.panels:
+                return None
+            expression = Expression(expression, {x.id: x.data for x in panel.series.values()})
+            uuid4 = uuid.uuid4() if uuid4 is None else uuid4
+            group = DataStreamGroup(expression.primary.interval, False)
+            panel.groups[uuid4] = group
+            data = DerivedStream(expression, seconds=panel.seconds, retention=panel.retention, tiers=tiers, group=group)
+            series = self.insert(panel, label, data, uuid4)
+        return series
+
+    def insert(self, panel: Panel, label: str, data: DataStream, uuid4: uuid.UUID = None):
+        with self.lock:
+            if label is None:
+                index = len(panel.series) + 1
+                label = f"系列{index}"
+            series = Series(uuid.uuid4() if uuid4 is None else uuid4, panel, label, data)
+            if self.store is not None:
+                self.store.attach(series.id, data)
+            data.observers.append(functools.partial(self.broadcaster.notify, panel.id, series.id))
+            panel.series[series.id] = series
+            self.series[series.id] = series
+            self.submit("series", series.id, panel=panel.id, label=label, data=data)
+        return series
+
+    def update_series(self, series: Series, label: str = None, interval: int = 1, reducer: str = "last", tiers: list = None):
+        with self.lock:
+            if series.id not in self.series:
+                return None
+            series.label = label
+            derived = series.expression is not None
+            if (interval != series.interval) and not derived:
+                series.data.interval = interval
+                series.panel.group(interval).add(series.data)
+                series.panel.prune()
+            if not derived:
+                series.data.reducer = reducer
+            if (tiers is not None) and (tiers != series.tiers):
+                series.data.set_tiers(tiers)
+            self.submit("series", series.id, panel=series.panel.id, label=label, data=series.data)
+        return series
+
+    def dependents(self, series: Series):
+        with self.lock:
+            list_ = [x for x in series.panel.series.values() if (x.expression is not None) and (series.data in x.data.expression.sources)]
+        return list_
+
+    def remove_series(self, series: Series):
+        with self.lock:
+            if series.id not in self.series:
+                return None
+            for dependent in self.dependents(series):
+                self.remove_series(dependent)
+            self.close(series)
+            self.submit("remove_series", series.id, panel=series.panel.id)
+        return series
+
+    def close(self, series: Series):
+        series.data.close()
+        series.panel.prune()
+        if self.store is not None:
+            self.store.detach(series.id, series.data)
+        series.panel.series.pop(series.id, None)
+        self.series.pop(series.id, None)
+
+    def export(self, panels: list, seconds: int = None):
+        with self.lock:
+            columns = [(x.label if len(panels) == 1 else f"{panel.id if panel.title is None else panel.title}/{x.label}", x.data) for panel in panels for x in panel.series.values()]
+        export = Export(columns, seconds)
+        return export
+
+    def describe(self):
+        with self.lock:
+            list_ = list()
+            for panel in self.panels.values():
+                lines = list()
+                for series in panel.series.values():
+                    lines.append({
+                        "id": str(series.id),
+                        "label": series.label,
+                        "interval": series.interval,
+                        "reducer": series.reducer,
+                        "tiers": series.tiers,
+                        "expression": series.expression
+                    })
+                dict_ = {
+                    "id": str(panel.id),
+                    "title": panel.title,
+                    "unit": panel.unit,
+                    "seconds": panel.seconds,
+                    "retention": panel.retention,
+                    "bottom": panel.bottom,
+                    "top": panel.top,
+                    "lines": lines
+                }
+                list_.append(dict_)
+        layout = {"axes": list_}
+        return layout
+
+
+class Listener:
+
+    size = 65536
+
+    def __init__(self, scene: Scene):
+        self.scene = scene
+        self.cache = dict()
+        self.revision = None
+        self.received = 0
+        self.rejected = 0
+
+    def resolve(self, key: bytes):
+        if self.revision != self.scene.revision:
+            with self.scene.lock:
+                self.revision = self.scene.revision
+                dict_ = dict()
+                for series in self.scene.series.values():
+                    dict_[series.id.hex[:8].encode()] = series.data
+                    dict_[series.id.hex.encode()] = series.data
+                    dict_[str(series.id).encode()] = series.data
+                self.cache = dict_
+        data = self.cache.get(key)
+        return data
+
+    def feed(self, view: memoryview):
+        for line in view.tobytes().splitlines():
+            fields = line.split()
+            if len(fields) == 0:
+                continue
+            try:
+                data = self.resolve(fields[0])
+                value = float(fields[1])
+                timestamp = float(fields[2]) if len(fields) > 2 else None
+            except (IndexError, ValueError):
+                data = None
+            if (data is None) or (len(fields) > 3):
+                self.rejected += 1
+                continue
+            data.append(value, timestamp)
+            self.received += 1
+
+    def serve_udp(self, host: str, port: int):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        sock.bind((host, port))
+        buffer = bytearray(self.size)
+        view = memoryview(buffer)
+        while True:
+            length = sock.recv_into(buffer)
+            self.feed(view[:length])
+
+    def serve_tcp(self, host: str, port: int):
+        server = socket.create_server((host, port))
+        while True:
+            connection, _ = server.accept()
+            thread = threading.Thread(target=self.receive, args=(connection,), daemon=True)
+            thread.start()
+
+    def receive(self, connection: socket.socket):
+        buffer = bytearray(self.size)
+        view = memoryview(buffer)
+        length = 0
+        with connection:
+            while True:
+                if length == self.size:
+                    self.rejected += 1
+                    length = 0
+                count = connection.recv_into(view[length:])
+                if count == 0:
+                    break
+                length += count
+                end = buffer.rfind(b"\n", 0, length) + 1
+                if end == 0:
+                    continue
+                self.feed(view[:end])
+                buffer[:length - end] = buffer[end:length]
+                length -= end
+            self.feed(view[:length])
+
+    def start(self, host: str = "127.0.0.1", udp: int = None, tcp: int = None):
+        for target, port in [(self.serve_udp, udp), (self.serve_tcp, tcp)]:
+            if port is None:
+                continue
+            thread = threading.Thread(target=target, args=(host, port), daemon=True)
+            thread.start()
+
+
+class Export:
+
+    size = 10000
+
+    def __init__(self, columns: list, seconds: int = None):
+        self.names = list()
+        self.streams = list()
+        self.snapshots = list()
+        for name, stream in columns:
+            name = name if name not in self.names else f"{name} ({len(self.names) + 1})"
+            with stream.lock:
+                slot = int(stream.timestamp // stream.interval)
+                snapshot = (stream.sequence - 1, stream.count, slot, stream.interval)
+            self.names.append(name)
+            self.streams.append(stream)
+            self.snapshots.append(snapshot)
+        available = [(x[2] - x[1] + 1) * x[3] for x in self.snapshots if x[1] > 0]
+        self.start = min(available, default=0)
+        self.stop = max([(x[2] + 1) * x[3] for x in self.snapshots if x[1] > 0], default=0)
+        if seconds is not None:
+            self.start = max(self.start, self.stop - seconds)
+        self.step = min([x[3] for x in self.snapshots], default=1)
+
+    def read(self, index: int, begin: int, end: int):
+        stream = self.streams[index]
+        last, count, slot, interval = self.snapshots[index]
+        slots = numpy.arange(-(-begin // interval), -(-end // interval), dtype=numpy.int64)
+        sequences = last - (slot - slots)
+        slots = slots[(sequences > last - count) & (sequences <= last)]
+        sequences = last - (slot - slots)
+        values = numpy.full(len(slots), numpy.nan)
+        with stream.lock:
+            offsets = stream.sequence - sequences
+            valid = (offsets >= 1) & (offsets <= stream.count)
+            if stream.capacity > 0:
+                values[valid] = stream.buffer[(stream.head - offsets[valid]) % stream.capacity]
+        return slots * interval, values
+
+    def chunks(self):
+        for begin in range(self.start, self.stop, self.size * self.step):
+            end = min(begin + self.size * self.step, self.stop)
+            columns = [self.read(x, begin, end) for x in range(len(self.streams))]
+            timestamps = numpy.unique(numpy.concatenate([x[0] for x in columns] + [numpy.empty(0, dtype=numpy.int64)]))
+            if len(timestamps) == 0:
+                continue
+            rows = numpy.full((len(timestamps), len(columns)), numpy.nan)
+            for index, (x, y) in enumerate(columns):
+                rows[numpy.searchsorted(timestamps, x), index] = y
+            yield timestamps, rows
+
+    def csv(self):
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerow(["timestamp"] + self.names)
+        yield buffer.getvalue()
+        for timestamps, rows in self.chunks():
+            cells = numpy.where(numpy.isnan(rows), "", rows.astype(str))
+            lines = [f"{x}," + ",".join(y) for x, y in zip(timestamps.tolist(), cells.tolist())]
+            yield "\n".join(lines) + "\n"
+
+    def parquet(self):
+        import pyarrow
+        import pyarrow.parquet
+        sink = Sink()
+        fields = [pyarrow.field("timestamp", pyarrow.timestamp("s", tz="UTC"))] + [pyarrow.field(x, pyarrow.float64()) for x in self.names]
+        schema = pyarrow.schema(fields)
+        with pyarrow.parquet.ParquetWriter(sink, schema) as writer:
+            for timestamps, rows in self.chunks():
+                arrays = [pyarrow.array(timestamps, pyarrow.timestamp("s", tz="UTC"))]
+                arrays += [pyarrow.array(rows[:, x], from_pandas=True) for x in range(len(self.names))]
+                writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+                yield sink.drain()
+        yield sink.drain()
+
+
+class Sink(io.RawIOBase):
+
+    def __init__(self):
+        self.chunks = list()
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, bytes_):
+        self.chunks.append(bytes(bytes_))
+        self.position += len(bytes_)
+        return len(bytes_)
+
+    def tell(self):
+        int_ = self.position
+        return int_
+
+    def drain(self):
+        bytes_ = b"".join(self.chunks)
+        self.chunks.clear()
+        return bytes_
+
 
 class StreamPlotter:
 
-    def __init__(self, title: str = None):
+    def __init__(self, title: str = None, blit: bool = False, headless: bool = False, ingest: bool = False):
+        self.figure = None if ingest else self.create(title, headless)
+        self.title = title
+        self.metrics = Metrics() if ingest else self.figure.metrics
+        self.timings = dict()
+        self.period = None
+        self.average = None
+        self.skipped = 0
+        self.broadcaster = Broadcaster()
+        self.scene = Scene(self.broadcaster, not ingest)
+        self.blit = blit
+        self.headless = headless
+        self.backgrounds = dict()
+        self.frames = dict()
+        self.remote = None
+        self.lock = threading.RLock()
+        self.instrument()
+
+    def create(self, title: str = None, headless: bool = False):
+        load()
         japanize_matplotlib.japanize()
         matplotlib.rcParams["toolbar"] = "None"
         matplotlib.rcParams["lines.marker"] = "."
-        matplotlib.pyplot.show()
+        if headless:
+            matplotlib.use("Agg")
+        else:
+            matplotlib.pyplot.show()
         figure = matplotlib.pyplot.figure(title)
         figure.canvas.mpl_connect("close_event", self.close)
-        self.figure = figure
+        figure.canvas.mpl_connect("draw_event", self.capture)
+        figure.canvas.mpl_connect("resize_event", self.invalidate)
+        figure.registry = Registry()
+        figure.layouts = dict()
+        figure.metrics = Metrics()
+        figure.dirty = True
+        figure.revision = 0
+        return figure
+
+    def spawn(self, blit: bool = False, headless: bool = False, fps: float = 1.0, minimum: float = None):
+        with self.scene.lock:
+            if self.scene.commands.maxlen == 0:
+                self.scene.commands = collections.deque()
+        self.remote = RenderProcess(self.scene, self.title, blit, headless, fps, minimum)
+
+    def instrument(self):
+        scheduler = DataStream.scheduler
+        self.metrics.register("streamplotter_tick_lateness_seconds", "histogram", "予定時刻からの集計の遅れ(秒)", scheduler.lateness)
+        self.metrics.register("streamplotter_tick_seconds", "histogram", "1間隔分の集計にかかった時間(秒)", scheduler.duration)
+        self.metrics.collect("streamplotter_scheduler_streams", "gauge", "スケジューラに登録された集計対象の数", lambda: scheduler.streams)
+        self.metrics.collect("streamplotter_scheduler_intervals", "gauge", "スケジューラの間隔の種類数", lambda: len(scheduler.buckets))
+        self.metrics.collect("streamplotter_scheduler_threads", "gauge", "スケジューラのスレッド数", lambda: scheduler.threads)
+        self.metrics.collect("streamplotter_scheduler_wakeups_total", "counter", "スケジューラの起床回数", lambda: scheduler.wakeups)
+        self.metrics.collect("streamplotter_scheduler_ticks_total", "counter", "スケジューラの集計回数", lambda: scheduler.ticks)
+        self.metrics.collect("streamplotter_scheduler_errors_total", "counter", "集計中に発生した例外の数", lambda: scheduler.errors)
+        self.metrics.collect("streamplotter_reserved_points", "gauge", "集計待ちのプロットデータ数 (合計)", lambda: sum(self.backlog()))
+        self.metrics.collect("streamplotter_reserved_points_max", "gauge", "集計待ちのプロットデータ数 (データ系列ごとの最大)", lambda: max(self.backlog(), default=0))
+        self.metrics.collect("streamplotter_axes_update_seconds", "gauge", "直近の描画更新でプロットエリアごとにかかった時間(秒)", lambda: [({"axes": str(k)}, v) for k, v in self.timings.items()])
+        self.metrics.collect("streamplotter_frame_period_seconds", "gauge", "現在の描画間隔(秒)", lambda: self.period or 0.0)
+        self.metrics.collect("streamplotter_frames_skipped_total", "counter", "変更がなく省略した描画の回数", lambda: self.skipped)
+        self.metrics.histogram("streamplotter_update_seconds", "描画更新にかかった時間(秒)")
+        self.metrics.histogram("streamplotter_draw_seconds", "ウィンドウの再描画にかかった時間(秒)")
+        self.metrics.histogram("streamplotter_render_seconds", "画像の生成にかかった時間(秒)")
+        self.metrics.histogram("streamplotter_yrange_seconds", "縦軸の範囲の計算にかかった時間(秒)")
+
+    def backlog(self):
+        with self.scene.lock:
+            list_ = [len(x.data.reserved) for x in self.scene.series.values()]
+        return list_
 
     def close(self, _):
+        if self.scene.store is not None:
+            self.scene.store.flush(self.scene)
         sys.exit(0)
 
+    def open(self, path: str, sync: float = 1.0):
+        store = Store(path, sync)
+        layout = store.load()
+        self.scene.store = store
+        for dict_ in layout["axes"]:
+            panel = self.scene.add_panel(dict_["title"], dict_["unit"], dict_["seconds"], dict_["retention"], dict_["bottom"], dict_["top"], uuid.UUID(dict_["id"]))
+            for line in dict_["lines"]:
+                tiers = [tuple(x) for x in line["tiers"]]
+                if line.get("expression") is None:
+                    self.scene.add_series(panel, line["label"], line["interval"], line["reducer"], tiers, uuid.UUID(line["id"]))
+                else:
+                    self.scene.add_derived(panel, line["label"], line["expression"], tiers, uuid.UUID(line["id"]))
+        store.start(self.scene)
+
+    def apply(self, name: str, uuid4: uuid.UUID, kwargs: dict):
+        figure = Figure(self.figure)
+        if name == "panel":
+            axes = figure.extract(uuid4)
+            axes = figure.append(kwargs["title"], uuid4, False) if axes is None else axes
+            axes.set_title(kwargs["title"])
+            axes.set_unit(kwargs["unit"])
+            axes.set_xrange(kwargs["seconds"])
+            axes.set_yrange(kwargs["bottom"], kwargs["top"])
+        elif name == "remove_panel" and figure.extract(uuid4) is not None:
+            figure.remove(uuid4, False)
+        elif name == "series":
+            axes = figure.extract(kwargs["panel"])
+            if axes is None:
+                return
+            line = axes.extract(uuid4)
+            if line is None:
+                axes.append(kwargs["label"], kwargs["data"], uuid4)
+            else:
+                line.set_label(kwargs["label"])
+        elif name == "remove_series":
+            axes = figure.extract(kwargs["panel"])
+            if (axes is not None) and (axes.extract(uuid4) is not None):
+                axes.remove(uuid4)
+
+    def invalidate(self, _=None):
+        Figure(self.figure).invalidate()
+
+    def capture(self, _):
+        if not self.blit:
+            return
+        canvas = self.figure.canvas
+        self.backgrounds = {x: canvas.copy_from_bbox(x.bbox) for x in self.figure.axes}
+        for axes in self.figure.axes:
+            for line in axes.lines:
+                axes.draw_artist(line)
+        self.figure.dirty = False
+
+    def arrange(self):
+        axes = list(self.figure.axes)
+        for command in self.scene.drain():
+            self.apply(*command)
+        if axes != self.figure.axes:
+            Figure(self.figure).rearrange()
+
+    def follow(self, interval: float = 1.0):
+        while True:
+            time.sleep(interval)
+            with self.lock:
+                self.arrange()
+
     def update(self):
-        list_ = self.figure.axes
-        lines = itertools.chain.from_iterable([x.lines for x in list_])
-        for line in lines:
-            Line2D(line).update()
+        start = time.perf_counter()
+        self.arrange()
+        timings = dict()
+        for axes in self.figure.axes:
+            begin = time.perf_counter()
+            Axes(axes).update()
+            timings[axes.id] = time.perf_counter() - begin
+        self.timings = timings
+        self.metrics.histogram("streamplotter_update_seconds").observe(time.perf_counter() - start)
 
-    def run(self, interval: int = 1):
+    def draw(self):
+        if self.headless:
+            return
+        start = time.perf_counter()
+        self.paint()
+        self.metrics.histogram("streamplotter_draw_seconds").observe(time.perf_counter() - start)
+
+    def paint(self):
+        canvas = self.figure.canvas
+        if not self.blit:
+            canvas.draw()
+        elif self.figure.dirty:
+            for axes in self.figure.axes:
+                for line in axes.lines:
+                    line.set_animated(True)
+            canvas.draw()
+        else:
+            for axes in self.figure.axes:
+                background = self.backgrounds.get(axes)
+                if background is None:
+                    continue
+                canvas.restore_region(background)
+                for line in axes.lines:
+                    axes.draw_artist(line)
+                canvas.blit(axes.bbox)
+
+    def wait(self, seconds: float = 0.1):
+        if self.headless:
+            time.sleep(seconds)
+            return
+        matplotlib.pyplot.show(block=False)
+        self.figure.canvas.start_event_loop(seconds)
+
+    def render(self, uuid4: uuid.UUID = None, format: str = "png"):
+        with self.lock:
+            key = (uuid4, format)
+            revision = (DataStream.scheduler.ticks, self.scene.revision)
+            frame = self.frames.get(key)
+            if frame is not None and frame[0] == revision:
+                return frame[1]
+            start = time.perf_counter()
+            self.update()
+            buffer = io.BytesIO()
+            if uuid4 is None:
+                self.figure.savefig(buffer, format=format)
+            else:
+                axes = Figure(self.figure).extract(uuid4)
+                if axes is None:
+                    return None
+                axes = axes.entity
+                renderer = self.figure.canvas.get_renderer()
+                bbox = axes.get_tightbbox(renderer).transformed(self.figure.dpi_scale_trans.inverted())
+                self.figure.savefig(buffer, format=format, bbox_inches=bbox)
+            bytes_ = buffer.getvalue()
+            self.frames[key] = (revision, bytes_)
+            self.metrics.histogram("streamplotter_render_seconds").observe(time.perf_counter() - start)
+        return bytes_
+
+    def state(self):
+        tuple_ = (DataStream.scheduler.ticks, self.scene.revision, self.figure.revision)
+        return tuple_
+
+    def govern(self, elapsed: float, target: float, ceiling: float):
+        self.average = elapsed if self.average is None else self.average * 0.8 + elapsed * 0.2
+        if self.average > self.period * 0.5:
+            self.period = min(self.period * 2, ceiling)
+        elif (self.average < self.period * 0.2) and (self.period > target):
+            self.period = max(self.period / 2, target)
+
+    def run(self, interval: float = 1, fps: float = None, minimum: float = None):
+        target = 1 / fps if fps else interval
+        ceiling = max(1 / minimum if minimum else target * 4, target)
         def decorator(function):
             def wrapper(*args, **kwargs):
-                basetime = time.time()
+                self.period = target
+                self.average = None
+                state = None
+                basetime = time.perf_counter()
                 while True:
-                    function(*args, **kwargs)
-                    matplotlib.pyplot.pause(0.1)
-                    elapsed = time.time() - basetime
-                    seconds = elapsed + (interval - elapsed % interval)
-                    basetime += seconds
-                    while time.time() < basetime:
-                        time.sleep(0.1)
+                    if self.state() != state:
+                        start = time.perf_counter()
+                        with self.lock:
+                            function(*args, **kwargs)
+                            self.draw()
+                        state = self.state()
+                        self.govern(time.perf_counter() - start, target, ceiling)
+                    else:
+                        self.skipped += 1
+                    basetime += self.period
+                    now = time.perf_counter()
+                    basetime = now + self.period if basetime < now else basetime
+                    self.wait(max(basetime - now, 0.001))
             return wrapper
         return decorator
 
 
+class RemotePlotter(StreamPlotter):
+
+    def __init__(self, connection, title: str = None, blit: bool = False, headless: bool = False):
+        super().__init__(title, blit, headless)
+        self.connection = connection
+        self.streams = dict()
+        self.sources = dict()
+
+    def state(self):
+        with self.scene.lock:
+            sequence = sum([x.sequence for x in self.sources.values()])
+        tuple_ = (sequence, self.scene.revision, self.figure.revision)
+        return tuple_
+
+    def attach(self, name: str):
+        source = self.sources.get(name)
+        if source is None:
+            source = SharedBuffer(name)
+            self.sources[name] = source
+        source.references += 1
+        return source
+
+    def detach(self, stream: SharedStream):
+        source = stream.source
+        stream.source = None
+        if source is None:
+            return
+        source.references -= 1
+        if source.references == 0:
+            del self.sources[source.name]
+            source.close()
+
+    def dispatch(self, name: str, uuid4: uuid.UUID, kwargs: dict):
+        if name == "bind":
+            stream = self.streams.get(uuid4)
+            if stream is None:
+                return
+            try:
+                source = self.attach(kwargs["name"])
+            except FileNotFoundError:
+                return
+            self.detach(stream)
+            stream.bind(source, kwargs["column"])
+            return
+        if name == "series":
+            stream = self.streams.get(uuid4)
+            if stream is None:
+                stream = SharedStream(kwargs["panel"])
+                self.streams[uuid4] = stream
+            stream.interval = kwargs.pop("interval")
+            kwargs["data"] = stream
+        elif name == "remove_series":
+            stream = self.streams.pop(uuid4, None)
+            if stream is not None:
+                self.detach(stream)
+        elif name == "remove_panel":
+            for key, stream in list(self.streams.items()):
+                if stream.panel == uuid4:
+                    self.detach(self.streams.pop(key))
+        self.scene.submit(name, uuid4, **kwargs)
+
+    def receive(self):
+        while True:
+            try:
+                messages = self.connection.recv()
+            except EOFError:
+                os._exit(0)
+            with self.lock, self.scene.lock:
+                for message in messages:
+                    self.dispatch(*message)
+
+    @staticmethod
+    def main(connection, title: str = None, blit: bool = False, headless: bool = False, fps: float = 1.0, minimum: float = None):
+        plotter = RemotePlotter(connection, title, blit, headless)
+        thread = threading.Thread(target=plotter.receive, daemon=True)
+        thread.start()
+        plotter.run(fps=fps, minimum=minimum)(plotter.update)()
+
+
+class RenderProcess:
+
+    def __init__(self, scene: Scene, title: str = None, blit: bool = False, headless: bool = False, fps: float = 1.0, minimum: float = None, period: float = 0.02):
+        DataStreamGroup.shared = True
+        self.scene = scene
+        self.period = period
+        self.bindings = dict()
+        self.connection, remote = multiprocessing.Pipe()
+        context = multiprocessing.get_context("spawn")
+        self.process = context.Process(target=RemotePlotter.main, args=(remote, title, blit, headless, fps, minimum), daemon=True)
+        self.process.start()
+        self.thread = threading.Thread(target=self.forward, daemon=True)
+        self.thread.start()
+
+    def collect(self):
+        messages = list()
+        for name, uuid4, kwargs in self.scene.drain():
+            kwargs = dict(kwargs)
+            data = kwargs.pop("data", None)
+            if data is not None:
+                kwargs["interval"] = data.interval
+            messages.append((name, uuid4, kwargs))
+        with self.scene.lock:
+            bindings = dict()
+            for series in self.scene.series.values():
+                group = series.data.group
+                if (group is not None) and (group.memory is not None):
+                    bindings[series.id] = {"name": group.memory.name, "column": series.data.column}
+        for uuid4, binding in bindings.items():
+            if self.bindings.get(uuid4) != binding:
+                messages.append(("bind", uuid4, binding))
+        self.bindings = bindings
+        return messages
+
+    def forward(self):
+        while True:
+            messages = self.collect()
+            if (len(messages) > 0) and self.process.is_alive():
+                try:
+                    self.connection.send(messages)
+                except OSError:
+                    pass
+            time.sleep(self.period)
+
+    def close(self):
+        with self.scene.lock:
+            for panel in self.scene.panels.values():
+                for group in panel.groups.values():
+                    with group.lock:
+                        group.release()
+
+
 class Figure:
 
     def __init__(self, entity: matplotlib.figure.Figure):
         self.entity = entity
 
+    @property
+    def registry(self) -> Registry:
+        registry = self.entity.registry
+        return registry
+
     def grid(self, count: int = None):
         length = len(self.entity.axes)
         count = length if count is None else count
@@ -107,39 +2173,57 @@ class Figure:
         ncols = int(rounded)
         return nrows, ncols
 
-    def rearrange(self, count: int = None):
-        length = len(self.entity.axes)
+    def layout(self, count: int = None):
         nrows, ncols = self.grid(count)
-        for index in range(length):
-            axes = self.entity.add_subplot(nrows, ncols, index+1)
-            bbox = axes.get_position()
-            self.entity.delaxes(axes)
-            self.entity.axes[index].set_position(bbox)
+        if nrows * ncols == 0:
+            return list()
+        params = self.entity.subplotpars
+        key = (nrows, ncols, params.left, params.right, params.bottom, params.top, params.wspace, params.hspace)
+        positions = self.entity.layouts.get(key)
+        if positions is None:
+            gridspec = matplotlib.gridspec.GridSpec(nrows, ncols, figure=self.entity)
+            positions = [gridspec[index].get_position(self.entity) for index in range(nrows * ncols)]
+            self.entity.layouts[key] = positions
+        return positions
+
+    def rearrange(self, count: int = None):
+        positions = self.layout(count)
+        for axes, bbox in zip(self.entity.axes, positions):
+            axes.set_position(bbox)
 
     def extract(self, uuid4: uuid.UUID):
-        list_ = [x for x in self.entity.axes if x.id == uuid4]
-        axes = Axes(list_[0]) if len(list_) > 0 else None
+        entity = self.registry.axes.get(uuid4)
+        axes = Axes(entity) if entity is not None else None
         return axes
 
-    def append(self, title: str = None):
+    def append(self, title: str = None, uuid4: uuid.UUID = None, arrange: bool = True):
         length = len(self.entity.axes)
         count = length + 1
-        self.rearrange(count)
-        nrows, ncols = self.grid(count)
-        axes = self.entity.add_subplot(nrows, ncols, count)
+        if arrange:
+            self.rearrange(count)
+        axes = self.entity.add_axes(self.layout(count)[length])
         axes.plot()
         axes.grid()
         axes.set_title(title)
-        axes.id = uuid.uuid4()
+        axes.id = uuid.uuid4() if uuid4 is None else uuid4
         axes.xrange = (-100, 0)
         axes.yrange = (None, None)
+        self.registry.add_axes(axes)
+        self.invalidate()
         axes = Axes(axes)
         return axes
 
-    def remove(self, uuid4: uuid.UUID):
+    def remove(self, uuid4: uuid.UUID, arrange: bool = True):
         axes = self.extract(uuid4)
+        self.registry.remove_axes(axes.id)
         self.entity.delaxes(axes.entity)
-        self.rearrange()
+        if arrange:
+            self.rearrange()
+        self.invalidate()
+
+    def invalidate(self):
+        self.entity.dirty = True
+        self.entity.revision += 1
 
 
 class Axes:
@@ -148,31 +2232,43 @@ class Axes:
         self.entity = entity
 
     def extract(self, uuid4: uuid.UUID):
-        list_ = [x for x in self.entity.lines if x.id == uuid4]
-        line = Line2D(list_[0]) if len(list_) > 0 else None
+        entity = self.registry.lines.get(uuid4)
+        line = Line2D(entity) if (entity is not None and entity.axes is self.entity) else None
         return line
 
-    def append(self, label: str = None):
+    def append(self, label: str = None, data: DataStream = None, uuid4: uuid.UUID = None):
         if label is None:
             index = len(self.entity.lines) + 1
             label = f"系列{index}"
-        data = DataStream()
+        data = DataStream(seconds=self.seconds) if data is None else data
         x, y = data.latest(self.seconds)
         self.entity.plot(x, y, label=label)
         self.entity.legend()
         line = self.entity.lines[-1]
-        line.id = uuid.uuid4()
+        line.id = uuid.uuid4() if uuid4 is None else uuid4
         line.data = data
+        self.registry.add_line(line)
+        self.invalidate()
         line = Line2D(line)
         return line
 
     def remove(self, uuid4: uuid.UUID):
         line = self.extract(uuid4)
+        self.registry.remove_line(line.id)
         line.entity.remove()
         if len(self.entity.lines) > 0:
             self.entity.legend()
         else:
             self.entity.legend().remove()
+        self.invalidate()
+
+    def invalidate(self):
+        Figure(self.entity.figure).invalidate()
+
+    @property
+    def registry(self) -> Registry:
+        registry = self.entity.figure.registry
+        return registry
 
     def get_xrange(self):
         left = self.seconds * -1
@@ -184,13 +2280,12 @@ class Axes:
         return left, right
 
     def get_yrange(self):
-        lines = [Line2D(x) for x in self.entity.lines]
-        data = [x.data.latest(self.seconds)[1] for x in lines]
-        data = numpy.concatenate(data) if len(data) > 0 else None
-        min_value = numpy.nan if data is None else numpy.nanmin(data)
-        min_value = 0.0 if numpy.isnan(min_value) else min_value
-        max_value = numpy.nan if data is None else numpy.nanmax(data)
-        max_value = 0.0 if numpy.isnan(max_value) else max_value
+        width = int(self.entity.bbox.width)
+        extrema = [Line2D(x).data.extrema(self.seconds, width) for x in self.entity.lines]
+        minimums = [x[0] for x in extrema if not numpy.isnan(x[0])]
+        maximums = [x[1] for x in extrema if not numpy.isnan(x[1])]
+        min_value = min(minimums) if len(minimums) > 0 else 0.0
+        max_value = max(maximums) if len(maximums) > 0 else 0.0
         diff = max_value - min_value
         margin = diff * 0.1 if diff > 0 else 0.05
         bottom = min_value - margin if self.bottom is None else self.bottom
@@ -199,12 +2294,41 @@ class Axes:
         top = bottom if (bottom > top and self.top is None) else top
         return bottom, top
 
+    def update(self):
+        width = int(self.entity.bbox.width)
+        frames = dict()
+        for line in self.entity.lines:
+            group = line.data.group
+            if (group is not None) and (group not in frames):
+                frames[group] = group.decimate(self.seconds, width)
+            Line2D(line).update(frames.get(group, dict()).get(line.data))
+        xrange = self.get_xrange()
+        start = time.perf_counter()
+        yrange = self.get_yrange()
+        self.entity.figure.metrics.histogram("streamplotter_yrange_seconds").observe(time.perf_counter() - start)
+        if xrange != self.entity.get_xlim():
+            self.entity.set_xlim(*xrange)
+            self.invalidate()
+        if yrange != self.entity.get_ylim():
+            self.entity.set_ylim(*yrange)
+            self.invalidate()
+
+    def set_title(self, title: str = None):
+        self.entity.set_title(title)
+        self.invalidate()
+
+    def set_unit(self, unit: str = None):
+        self.entity.set_ylabel(unit)
+        self.invalidate()
+
     def set_xrange(self, seconds: int = 100):
         seconds = seconds if seconds > 0 else self.seconds
         self.entity.xrange = (seconds * -1, 0)
+        self.invalidate()
 
     def set_yrange(self, bottom: float = None, top: float = None):
         self.entity.yrange = (bottom, top)
+        self.invalidate()
 
     @property
     def id(self) -> uuid.UUID:
@@ -242,15 +2366,17 @@ class Line2D:
     def __init__(self, entity: matplotlib.lines.Line2D):
         self.entity = entity
 
-    def update(self):
+    def update(self, frame: tuple = None):
         axes = Axes(self.entity.axes)
-        x, y = self.entity.data.latest(axes.seconds)
+        width = int(self.entity.axes.bbox.width)
+        x, y = self.entity.data.decimate(axes.seconds, width) if frame is None else frame
         self.entity.set_xdata(x)
         self.entity.set_ydata(y)
-        xrange = axes.get_xrange()
-        yrange = axes.get_yrange()
-        self.entity.axes.set_xlim(*xrange)
-        self.entity.axes.set_ylim(*yrange)
+
+    def set_label(self, label: str = None):
+        self.entity.set_label(label)
+        self.entity.axes.legend()
+        Axes(self.entity.axes).invalidate()
 
     @property
     def id(self) -> uuid.UUID:
@@ -267,6 +2393,16 @@ class Line2D:
         int_ = self.data.interval
         return int_
 
+    @property
+    def reducer(self) -> str:
+        str_ = self.data.reducer
+        return str_
+
+    @property
+    def tiers(self) -> list:
+        list_ = [(x.step, x.seconds) for x in self.data.tiers]
+        return list_
+
     @property
     def data(self) -> DataStream:
         data = self.entity.data
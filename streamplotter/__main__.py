@@ -1,11 +1,18 @@
+import argparse
+import atexit
+import functools
 import flask
 import flask_restx
+import io
+import numpy
+import signal
 import sys
 import threading
+import time
 import uuid
-from .__init__ import Figure as _Figure
-from .__init__ import Axes as _Axes
-from .__init__ import Line2D as _Line2D
+from .__init__ import DataStream as _DataStream
+from .__init__ import Expression as _Expression
+from .__init__ import Listener as _Listener
 from .__init__ import StreamPlotter as _StreamPlotter
 
 
@@ -15,7 +22,28 @@ VERSION = "0.0"
 _App: flask.Flask = flask.Flask(TITLE)
 _Api: flask_restx.Api = flask_restx.Api(_App, version=VERSION, title=TITLE)
 _Namespace = _Api.namespace("figure", description="Figure operations")
-_Plotter: _StreamPlotter = _StreamPlotter(TITLE)
+_Plotter: _StreamPlotter = None
+_Formats = {"png": "image/png", "svg": "image/svg+xml"}
+_Exports = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+_MaxSeconds = 604800
+_Mimetypes = ["application/json", "application/octet-stream", "application/x-npy"]
+
+
+@_App.before_request
+def _before_request():
+    flask.g.start = time.perf_counter()
+
+
+@_App.after_request
+def _after_request(response: flask.Response):
+    if _Plotter is None:
+        return response
+    elapsed = time.perf_counter() - flask.g.get("start", time.perf_counter())
+    endpoint = flask.request.url_rule.rule if flask.request.url_rule is not None else "unmatched"
+    method = flask.request.method
+    _Plotter.metrics.histogram("streamplotter_http_request_duration_seconds", "リクエストの処理時間(秒)", endpoint=endpoint, method=method).observe(elapsed)
+    _Plotter.metrics.counter("streamplotter_http_requests_total", "リクエスト数", endpoint=endpoint, method=method, status=str(response.status_code)).inc()
+    return response
 
 
 class Model:
@@ -23,17 +51,52 @@ class Model:
         "title": flask_restx.fields.String(description="グラフタイトル", default="Title"),
         "unit": flask_restx.fields.String(description="単位", default="mm"),
         "seconds": flask_restx.fields.Integer(description="期間(秒)", default=600),
+        "retention": flask_restx.fields.Integer(description="保持期間(秒) (期間と同じ: null)", default=None),
         "bottom": flask_restx.fields.Float(description="上限 (自動: null)", default=-100),
         "top": flask_restx.fields.Float(description="下限 (自動: null)", default=100)
     })
+    _Tier = _Api.model("Tier", {
+        "step": flask_restx.fields.Integer(description="集計単位(秒)", default=60),
+        "seconds": flask_restx.fields.Integer(description="保持期間(秒)", default=604800)
+    })
     _Line2D = _Api.model("Line2D", {
         "label": flask_restx.fields.String(description="データラベル", default="Label"),
-        "interval": flask_restx.fields.Integer(description="間隔(秒)", default=1)
+        "interval": flask_restx.fields.Integer(description="間隔(秒)", default=1),
+        "reducer": flask_restx.fields.String(description="集計方法 (last, mean, min, max, count)", default="last"),
+        "tiers": flask_restx.fields.List(flask_restx.fields.Nested(_Tier), description="ロールアップ階層 (省略可)"),
+        "expression": flask_restx.fields.Raw(description="派生系列の式 (省略可, 指定時は間隔と集計方法を参照先から引き継ぎます)", default=None)
+    })
+    _Layout = _Api.inherit("Layout", _Axes, {
+        "lines": flask_restx.fields.List(flask_restx.fields.Nested(_Line2D), description="データ系列一覧 (省略可)")
     })
     _DataStream = _Api.model("DataStream", {
         "value": flask_restx.fields.Float(description="プロットデータ", default=0),
+        "timestamp": flask_restx.fields.Float(description="タイムスタンプ(UNIX時間) (受信時刻: null)", default=None),
+        "clear": flask_restx.fields.Boolean(description="初期化フラグ", default=False)
+    })
+    _Entry = _Api.model("Entry", {
+        "axes": flask_restx.fields.String(description="プロットエリアID"),
+        "line": flask_restx.fields.String(description="データ系列ID"),
+        "values": flask_restx.fields.List(flask_restx.fields.Float, description="プロットデータ"),
+        "timestamps": flask_restx.fields.List(flask_restx.fields.Float, description="タイムスタンプ(UNIX時間) (省略可)"),
         "clear": flask_restx.fields.Boolean(description="初期化フラグ", default=False)
     })
+    _Batch = _Api.model("Batch", {
+        "entries": flask_restx.fields.List(flask_restx.fields.Nested(_Entry), description="プロットデータ一覧")
+    })
+
+
+@_Api.route("/metrics")
+class Metrics(flask_restx.Resource):
+
+    @_Api.doc(description="実行時の計測値をPrometheusのテキスト形式で取得します。", responses={200: "Success"})
+    def get(self):
+        # **************************************************
+        #   Process:
+        # **************************************************
+        str_ = _Plotter.metrics.render()
+        response = flask.Response(str_, mimetype="text/plain; version=0.0.4")
+        return response
 
 
 @_Namespace.route("/")
@@ -44,55 +107,258 @@ class Figure(flask_restx.Resource):
         # **************************************************
         #   Process:
         # **************************************************
+        scene = _Plotter.scene
         list_ = list()
-        for axes in _Plotter.figure.axes:
-            axes = _Axes(axes)
-            dict_ = {
-                "id": str(axes.id),
-                "title": axes.title,
-                "unit": axes.unit,
-                "seconds": axes.seconds,
-                "bottom": axes.bottom,
-                "top": axes.top
-            }
-            list_.append(dict_)
+        with scene.lock:
+            for panel in scene.panels.values():
+                dict_ = {
+                    "id": str(panel.id),
+                    "title": panel.title,
+                    "unit": panel.unit,
+                    "seconds": panel.seconds,
+                    "retention": panel.retention,
+                    "bottom": panel.bottom,
+                    "top": panel.top
+                }
+                list_.append(dict_)
         response = {"axes": list_}
         return response, 200
 
-    @_Api.doc(description="プロットエリアを追加します。", body=Model._Axes, responses={201: "Created", 400: "Bad Request"})
+    @_Api.doc(description="プロットエリアを追加します。配列を送信すると、複数のプロットエリアをデータ系列とあわせて一括で追加します。", body=Model._Layout, responses={201: "Created", 400: "Bad Request"})
     def post(self):
         # **************************************************
         #   Validate:
         # **************************************************
         body = flask.request.json
-        title = body.get("title")
-        unit = body.get("unit")
-        seconds = body.get("seconds", 100)
-        if seconds < 1:
+        bulk = isinstance(body, list)
+        entries = list()
+        for item in body if bulk else [body]:
+            if not isinstance(item, dict):
+                response = {"message": "Bad Request"}
+                return response, 400
+            title = item.get("title")
+            unit = item.get("unit")
+            seconds = item.get("seconds", 100)
+            if (seconds < 1) or (seconds > _MaxSeconds):
+                response = {"message": "Bad Request"}
+                return response, 400
+            retention = item.get("retention")
+            if (retention is not None) and ((retention < 1) or (retention > _MaxSeconds)):
+                response = {"message": "Bad Request"}
+                return response, 400
+            bottom = item.get("bottom")
+            top = item.get("top")
+            if (bottom is not None) and (top is not None) and (bottom > top):
+                response = {"message": "Bad Request"}
+                return response, 400
+            lines = item.get("lines", list())
+            if not isinstance(lines, list) or not all([isinstance(x, dict) for x in lines]):
+                response = {"message": "Bad Request"}
+                return response, 400
+            list_ = list()
+            for line in lines:
+                label = line.get("label")
+                interval = line.get("interval", 1)
+                if interval < 1:
+                    response = {"message": "Bad Request"}
+                    return response, 400
+                reducer = line.get("reducer", "last")
+                if reducer not in _DataStream.reducers:
+                    response = {"message": "Bad Request"}
+                    return response, 400
+                try:
+                    tiers = [(int(x["step"]), int(x["seconds"])) for x in line.get("tiers", list())]
+                except:
+                    response = {"message": "Bad Request"}
+                    return response, 400
+                if any([(step < 1) or (seconds_ < step) or (seconds_ > _MaxSeconds) for step, seconds_ in tiers]):
+                    response = {"message": "Bad Request"}
+                    return response, 400
+                list_.append((label, interval, reducer, tiers))
+            entries.append(((title, unit, seconds, retention, bottom, top), list_))
+        # **************************************************
+        #   Process:
+        # **************************************************
+        scene = _Plotter.scene
+        list_ = list()
+        with scene.lock:
+            for arguments, lines in entries:
+                axes = scene.add_panel(*arguments)
+                lines = [scene.add_series(axes, *x) for x in lines]
+                dict_ = {
+                    "id": str(axes.id),
+                    "title": axes.title,
+                    "unit": axes.unit,
+                    "seconds": axes.seconds,
+                    "retention": axes.retention,
+                    "bottom": axes.bottom,
+                    "top": axes.top,
+                    "lines": [{
+                        "id": str(line.id),
+                        "label": line.label,
+                        "interval": line.interval,
+                        "reducer": line.reducer,
+                        "tiers": [{"step": x[0], "seconds": x[1]} for x in line.tiers]
+                    } for line in lines]
+                }
+                list_.append(dict_)
+        response = list_ if bulk else list_[0]
+        return response, 201
+
+
+@_Namespace.route("/image")
+class Image(flask_restx.Resource):
+
+    @_Api.doc(description="すべてのプロットエリアの画像を取得します。", params={"format": "画像形式 (png, svg)"}, responses={200: "Success", 400: "Bad Request", 501: "Not Implemented"})
+    def get(self):
+        # **************************************************
+        #   Validate:
+        # **************************************************
+        if _Plotter.figure is None:
+            response = {"message": "Not Implemented"}
+            return response, 501
+        format_ = flask.request.args.get("format", "png")
+        if format_ not in _Formats:
             response = {"message": "Bad Request"}
             return response, 400
-        bottom = body.get("bottom")
-        top = body.get("top")
-        if (bottom is not None) and (top is not None) and (bottom > top):
+        # **************************************************
+        #   Process:
+        # **************************************************
+        bytes_ = _Plotter.render(format=format_)
+        response = flask.Response(bytes_, mimetype=_Formats[format_])
+        return response
+
+
+@_Namespace.route("/export")
+class Export(flask_restx.Resource):
+
+    @_Api.doc(description="すべてのプロットエリアのデータ系列を、集計時刻で揃えてCSVまたはParquetで出力します。", params={"format": "出力形式 (csv, parquet)", "seconds": "期間(秒) (省略時: 保持しているすべて)"}, responses={200: "Success", 400: "Bad Request", 501: "Not Implemented"})
+    def get(self):
+        # **************************************************
+        #   Validate:
+        # **************************************************
+        format_ = flask.request.args.get("format", "csv")
+        if format_ not in _Exports:
+            response = {"message": "Bad Request"}
+            return response, 400
+        seconds = flask.request.args.get("seconds", None, type=int)
+        if (seconds is not None) and (seconds < 1):
             response = {"message": "Bad Request"}
             return response, 400
+        if format_ == "parquet":
+            try:
+                import pyarrow.parquet
+            except ImportError:
+                response = {"message": "Not Implemented"}
+                return response, 501
         # **************************************************
         #   Process:
         # **************************************************
-        figure = _Figure(_Plotter.figure)
-        axes = figure.append(title)
-        axes.entity.set_ylabel(unit)
-        axes.set_xrange(seconds)
-        axes.set_yrange(bottom, top)
-        response = {
-            "id": str(axes.id),
-            "title": axes.title,
-            "unit": axes.unit,
-            "seconds": axes.seconds,
-            "bottom": axes.bottom,
-            "top": axes.top
-        }
-        return response, 201
+        with _Plotter.scene.lock:
+            panels = list(_Plotter.scene.panels.values())
+        export = _Plotter.scene.export(panels, seconds)
+        generator = export.csv() if format_ == "csv" else export.parquet()
+        headers = {"Content-Disposition": f'attachment; filename="figure.{format_}"'}
+        response = flask.Response(generator, mimetype=_Exports[format_], headers=headers)
+        return response
+
+
+@_Namespace.route("/stream")
+class Stream(flask_restx.Resource):
+
+    @_Api.doc(description="追加されたプロットデータをServer-Sent Eventsで配信します。", params={"axes": "プロットエリアID (複数指定可, 省略時: すべて)", "line": "データ系列ID (複数指定可, 省略時: すべて)", "size": "配信待ちの上限件数"}, responses={200: "Success", 400: "Bad Request", 503: "Service Unavailable"})
+    def get(self):
+        # **************************************************
+        #   Validate:
+        # **************************************************
+        try:
+            keys = [uuid.UUID(x) for x in flask.request.args.getlist("axes") + flask.request.args.getlist("line")]
+        except:
+            response = {"message": "Bad Request"}
+            return response, 400
+        size = flask.request.args.get("size", 256, type=int)
+        if size < 1:
+            response = {"message": "Bad Request"}
+            return response, 400
+        # **************************************************
+        #   Process:
+        # **************************************************
+        subscriber = _Plotter.broadcaster.subscribe(set(keys) if len(keys) > 0 else None, size)
+        if subscriber is None:
+            response = {"message": "Service Unavailable"}
+            return response, 503
+        def generate():
+            dropped = 0
+            try:
+                while True:
+                    list_ = subscriber.get(15)
+                    if subscriber.dropped > dropped:
+                        yield f": dropped {subscriber.dropped - dropped}\n\n"
+                        dropped = subscriber.dropped
+                    yield "".join(list_) if len(list_) > 0 else ": keepalive\n\n"
+            finally:
+                _Plotter.broadcaster.unsubscribe(subscriber)
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        response = flask.Response(generate(), mimetype="text/event-stream", headers=headers)
+        return response
+
+
+@_Namespace.route("/batch")
+class Batch(flask_restx.Resource):
+
+    @_Api.doc(description="複数のデータ系列にプロットデータを一括で追加します。", body=Model._Batch, responses={200: "Success", 400: "Bad Request"})
+    def post(self):
+        # **************************************************
+        #   Validate:
+        # **************************************************
+        body = flask.request.json
+        entries = body.get("entries") if isinstance(body, dict) else None
+        if not isinstance(entries, list):
+            response = {"message": "Bad Request"}
+            return response, 400
+        # **************************************************
+        #   Process:
+        # **************************************************
+        scene = _Plotter.scene
+        list_ = list()
+        for entry in entries:
+            entry = entry if isinstance(entry, dict) else dict()
+            dict_ = {"axes": entry.get("axes"), "line": entry.get("line")}
+            list_.append(dict_)
+            try:
+                axes = uuid.UUID(entry.get("axes"))
+                line = uuid.UUID(entry.get("line"))
+            except:
+                dict_.update({"status": 400, "message": "Bad Request"})
+                continue
+            values = entry.get("values", list())
+            timestamps = entry.get("timestamps")
+            if not isinstance(values, list):
+                dict_.update({"status": 400, "message": "Bad Request"})
+                continue
+            if (timestamps is not None) and (not isinstance(timestamps, list) or len(timestamps) != len(values)):
+                dict_.update({"status": 400, "message": "Bad Request"})
+                continue
+            if not all([(x is None) or (isinstance(x, (int, float)) and not isinstance(x, bool)) for x in values]):
+                dict_.update({"status": 400, "message": "Bad Request"})
+                continue
+            if (timestamps is not None) and not all([isinstance(x, (int, float)) and not isinstance(x, bool) for x in timestamps]):
+                dict_.update({"status": 400, "message": "Bad Request"})
+                continue
+            axes = scene.panels.get(axes)
+            line = axes.series.get(line) if axes is not None else None
+            if line is None:
+                dict_.update({"status": 404, "message": "Not Found"})
+                continue
+            if line.expression is not None:
+                dict_.update({"status": 400, "message": "Bad Request"})
+                continue
+            if entry.get("clear", False):
+                line.data.clear()
+            line.data.extend(values, timestamps)
+            dict_.update({"status": 201, "message": "Created"})
+        response = {"entries": list_}
+        return response, 200
 
 
 @_Namespace.route("/<axes>")
@@ -103,13 +369,12 @@ class Axes(flask_restx.Resource):
         # **************************************************
         #   Validate:
         # **************************************************
-        figure = _Figure(_Plotter.figure)
         try:
             axes = uuid.UUID(axes)
         except:
             response = {"message": "Bad Request"}
             return response, 400
-        axes = figure.extract(axes)
+        axes = _Plotter.scene.panels.get(axes)
         if axes is None:
             response = {"message": "Not Found"}
             return response, 404
@@ -117,29 +382,31 @@ class Axes(flask_restx.Resource):
         #   Process:
         # **************************************************
         list_ = list()
-        for line in axes.entity.lines:
-            line = _Line2D(line)
-            dict_ = {
-                "id": str(line.id),
-                "label": line.label,
-                "interval": line.interval
-            }
-            list_.append(dict_)
+        with _Plotter.scene.lock:
+            for line in axes.series.values():
+                dict_ = {
+                    "id": str(line.id),
+                    "label": line.label,
+                    "interval": line.interval,
+                    "reducer": line.reducer,
+                    "tiers": [{"step": x[0], "seconds": x[1]} for x in line.tiers],
+                    "expression": line.expression
+                }
+                list_.append(dict_)
         response = {"lines": list_}
         return response, 200
 
-    @_Api.doc(description="データ系列を追加します。", body=Model._Line2D, responses={201: "Created", 400: "Bad Request", 404: "Not Found"})
+    @_Api.doc(description="データ系列を追加します。expression を指定すると、同じプロットエリアのデータ系列から集計ごとに計算される派生系列を追加します。", body=Model._Line2D, responses={201: "Created", 400: "Bad Request", 404: "Not Found"})
     def post(self, axes):
         # **************************************************
         #   Validate:
         # **************************************************
-        figure = _Figure(_Plotter.figure)
         try:
             axes = uuid.UUID(axes)
         except:
             response = {"message": "Bad Request"}
             return response, 400
-        axes = figure.extract(axes)
+        axes = _Plotter.scene.panels.get(axes)
         if axes is None:
             response = {"message": "Not Found"}
             return response, 404
@@ -149,15 +416,47 @@ class Axes(flask_restx.Resource):
         if interval < 1:
             response = {"message": "Bad Request"}
             return response, 400
+        reducer = body.get("reducer", "last")
+        if reducer not in _DataStream.reducers:
+            response = {"message": "Bad Request"}
+            return response, 400
+        try:
+            tiers = [(int(x["step"]), int(x["seconds"])) for x in body.get("tiers", list())]
+        except:
+            response = {"message": "Bad Request"}
+            return response, 400
+        if any([(step < 1) or (seconds < step) or (seconds > _MaxSeconds) for step, seconds in tiers]):
+            response = {"message": "Bad Request"}
+            return response, 400
+        expression = body.get("expression")
+        if expression is not None:
+            try:
+                with _Plotter.scene.lock:
+                    _Expression(expression, {x.id: x.data for x in axes.series.values()})
+            except:
+                response = {"message": "Bad Request"}
+                return response, 400
         # **************************************************
         #   Process:
         # **************************************************
-        line = axes.append(label)
-        line.data.interval = interval
+        if expression is None:
+            line = _Plotter.scene.add_series(axes, label, interval, reducer, tiers)
+        else:
+            try:
+                line = _Plotter.scene.add_derived(axes, label, expression, tiers)
+            except:
+                response = {"message": "Bad Request"}
+                return response, 400
+        if line is None:
+            response = {"message": "Not Found"}
+            return response, 404
         response = {
             "id": str(line.id),
             "label": line.label,
-            "interval": line.interval
+            "interval": line.interval,
+            "reducer": line.reducer,
+            "tiers": [{"step": x[0], "seconds": x[1]} for x in line.tiers],
+            "expression": line.expression
         }
         return response, 201
 
@@ -166,13 +465,12 @@ class Axes(flask_restx.Resource):
         # **************************************************
         #   Validate:
         # **************************************************
-        figure = _Figure(_Plotter.figure)
         try:
             axes = uuid.UUID(axes)
         except:
             response = {"message": "Bad Request"}
             return response, 400
-        axes = figure.extract(axes)
+        axes = _Plotter.scene.panels.get(axes)
         if axes is None:
             response = {"message": "Not Found"}
             return response, 404
@@ -180,7 +478,11 @@ class Axes(flask_restx.Resource):
         title = body.get("title", axes.title)
         unit = body.get("unit", axes.unit)
         seconds = body.get("seconds", axes.seconds)
-        if seconds < 1:
+        if (seconds < 1) or (seconds > _MaxSeconds):
+            response = {"message": "Bad Request"}
+            return response, 400
+        retention = body.get("retention", axes.retention)
+        if (retention is not None) and ((retention < 1) or (retention > _MaxSeconds)):
             response = {"message": "Bad Request"}
             return response, 400
         bottom = body.get("bottom", axes.bottom)
@@ -191,15 +493,15 @@ class Axes(flask_restx.Resource):
         # **************************************************
         #   Process:
         # **************************************************
-        axes.entity.set_title(title)
-        axes.entity.set_ylabel(unit)
-        axes.set_xrange(seconds)
-        axes.set_yrange(bottom, top)
+        if _Plotter.scene.update_panel(axes, title, unit, seconds, retention, bottom, top) is None:
+            response = {"message": "Not Found"}
+            return response, 404
         response = {
             "id": str(axes.id),
             "title": axes.title,
             "unit": axes.unit,
             "seconds": axes.seconds,
+            "retention": axes.retention,
             "bottom": axes.bottom,
             "top": axes.top
         }
@@ -210,24 +512,101 @@ class Axes(flask_restx.Resource):
         # **************************************************
         #   Validate:
         # **************************************************
-        figure = _Figure(_Plotter.figure)
         try:
             axes = uuid.UUID(axes)
         except:
             response = {"message": "Bad Request"}
             return response, 400
-        axes = figure.extract(axes)
+        axes = _Plotter.scene.panels.get(axes)
         if axes is None:
             response = {"message": "Not Found"}
             return response, 404
         # **************************************************
         #   Process:
         # **************************************************
-        figure.remove(axes.id)
+        if _Plotter.scene.remove_panel(axes) is None:
+            response = {"message": "Not Found"}
+            return response, 404
         response = {"message": "No Content"}
         return response, 204
 
 
+@_Namespace.route("/<axes>/image")
+class AxesImage(flask_restx.Resource):
+
+    @_Api.doc(description="プロットエリアの画像を取得します。", params={"format": "画像形式 (png, svg)"}, responses={200: "Success", 400: "Bad Request", 404: "Not Found", 501: "Not Implemented"})
+    def get(self, axes):
+        # **************************************************
+        #   Validate:
+        # **************************************************
+        if _Plotter.figure is None:
+            response = {"message": "Not Implemented"}
+            return response, 501
+        try:
+            axes = uuid.UUID(axes)
+        except:
+            response = {"message": "Bad Request"}
+            return response, 400
+        axes = _Plotter.scene.panels.get(axes)
+        if axes is None:
+            response = {"message": "Not Found"}
+            return response, 404
+        format_ = flask.request.args.get("format", "png")
+        if format_ not in _Formats:
+            response = {"message": "Bad Request"}
+            return response, 400
+        # **************************************************
+        #   Process:
+        # **************************************************
+        bytes_ = _Plotter.render(axes.id, format_)
+        if bytes_ is None:
+            response = {"message": "Not Found"}
+            return response, 404
+        response = flask.Response(bytes_, mimetype=_Formats[format_])
+        return response
+
+
+@_Namespace.route("/<axes>/export")
+class AxesExport(flask_restx.Resource):
+
+    @_Api.doc(description="プロットエリアのデータ系列を、集計時刻で揃えてCSVまたはParquetで出力します。", params={"format": "出力形式 (csv, parquet)", "seconds": "期間(秒) (省略時: 保持しているすべて)"}, responses={200: "Success", 400: "Bad Request", 404: "Not Found", 501: "Not Implemented"})
+    def get(self, axes):
+        # **************************************************
+        #   Validate:
+        # **************************************************
+        try:
+            axes = uuid.UUID(axes)
+        except:
+            response = {"message": "Bad Request"}
+            return response, 400
+        axes = _Plotter.scene.panels.get(axes)
+        if axes is None:
+            response = {"message": "Not Found"}
+            return response, 404
+        format_ = flask.request.args.get("format", "csv")
+        if format_ not in _Exports:
+            response = {"message": "Bad Request"}
+            return response, 400
+        seconds = flask.request.args.get("seconds", None, type=int)
+        if (seconds is not None) and (seconds < 1):
+            response = {"message": "Bad Request"}
+            return response, 400
+        if format_ == "parquet":
+            try:
+                import pyarrow.parquet
+            except ImportError:
+                response = {"message": "Not Implemented"}
+                return response, 501
+        # **************************************************
+        #   Process:
+        # **************************************************
+        export = _Plotter.scene.export([axes], seconds)
+        generator = export.csv() if format_ == "csv" else export.parquet()
+        headers = {"Content-Disposition": f'attachment; filename="{axes.id}.{format_}"'}
+        response = flask.Response(generator, mimetype=_Exports[format_], headers=headers)
+        return response
+
+
 @_Namespace.route("/<axes>/<line>")
 class Line2D(flask_restx.Resource):
 
@@ -236,13 +615,12 @@ class Line2D(flask_restx.Resource):
         # **************************************************
         #   Validate:
         # **************************************************
-        figure = _Figure(_Plotter.figure)
         try:
             axes = uuid.UUID(axes)
         except:
             response = {"message": "Bad Request"}
             return response, 400
-        axes = figure.extract(axes)
+        axes = _Plotter.scene.panels.get(axes)
         if axes is None:
             response = {"message": "Not Found"}
             return response, 404
@@ -251,19 +629,29 @@ class Line2D(flask_restx.Resource):
         except:
             response = {"message": "Bad Request"}
             return response, 400
-        line = axes.extract(line)
+        line = axes.series.get(line)
         if line is None:
             response = {"message": "Not Found"}
             return response, 404
+        if line.expression is not None:
+            response = {"message": "Bad Request"}
+            return response, 400
         body = flask.request.json
         value = body.get("value", None)
+        if (value is not None) and (not isinstance(value, (int, float)) or isinstance(value, bool)):
+            response = {"message": "Bad Request"}
+            return response, 400
+        timestamp = body.get("timestamp", None)
+        if (timestamp is not None) and (not isinstance(timestamp, (int, float)) or isinstance(timestamp, bool)):
+            response = {"message": "Bad Request"}
+            return response, 400
         clear = body.get("clear", False)
         # **************************************************
         #   Process:
         # **************************************************
         if clear:
             line.data.clear()
-        line.data.append(value)
+        line.data.append(value, timestamp)
         response = {"message": "Created"}
         return response, 201
 
@@ -272,13 +660,12 @@ class Line2D(flask_restx.Resource):
         # **************************************************
         #   Validate:
         # **************************************************
-        figure = _Figure(_Plotter.figure)
         try:
             axes = uuid.UUID(axes)
         except:
             response = {"message": "Bad Request"}
             return response, 400
-        axes = figure.extract(axes)
+        axes = _Plotter.scene.panels.get(axes)
         if axes is None:
             response = {"message": "Not Found"}
             return response, 404
@@ -287,7 +674,7 @@ class Line2D(flask_restx.Resource):
         except:
             response = {"message": "Bad Request"}
             return response, 400
-        line = axes.extract(line)
+        line = axes.series.get(line)
         if line is None:
             response = {"message": "Not Found"}
             return response, 404
@@ -297,31 +684,51 @@ class Line2D(flask_restx.Resource):
         if interval < 1:
             response = {"message": "Bad Request"}
             return response, 400
+        reducer = body.get("reducer", line.reducer)
+        if reducer not in _DataStream.reducers:
+            response = {"message": "Bad Request"}
+            return response, 400
+        try:
+            tiers = [(int(x["step"]), int(x["seconds"])) for x in body["tiers"]] if "tiers" in body else None
+        except:
+            response = {"message": "Bad Request"}
+            return response, 400
+        if any([(step < 1) or (seconds < step) or (seconds > _MaxSeconds) for step, seconds in tiers or list()]):
+            response = {"message": "Bad Request"}
+            return response, 400
+        if (line.expression is not None) and ((interval, reducer, body.get("expression", line.expression)) != (line.interval, line.reducer, line.expression)):
+            response = {"message": "Bad Request"}
+            return response, 400
+        if (interval != line.interval) and (len(_Plotter.scene.dependents(line)) > 0):
+            response = {"message": "Bad Request"}
+            return response, 400
         # **************************************************
         #   Process:
         # **************************************************
-        line.entity.set_label(label)
-        line.entity.axes.legend()
-        line.data.interval = interval
+        if _Plotter.scene.update_series(line, label, interval, reducer, tiers) is None:
+            response = {"message": "Not Found"}
+            return response, 404
         response = {
             "id": str(line.id),
             "label": line.label,
-            "interval": line.interval
+            "interval": line.interval,
+            "reducer": line.reducer,
+            "tiers": [{"step": x[0], "seconds": x[1]} for x in line.tiers],
+            "expression": line.expression
         }
         return response, 200
 
-    @_Api.doc(description="データ系列を削除します。", responses={200: "No Content", 400: "Bad Request", 404: "Not Found"})
+    @_Api.doc(description="データ系列を削除します。このデータ系列を参照する派生系列も削除します。", responses={200: "No Content", 400: "Bad Request", 404: "Not Found"})
     def delete(self, axes, line):
         # **************************************************
         #   Validate:
         # **************************************************
-        figure = _Figure(_Plotter.figure)
         try:
             axes = uuid.UUID(axes)
         except:
             response = {"message": "Bad Request"}
             return response, 400
-        axes = figure.extract(axes)
+        axes = _Plotter.scene.panels.get(axes)
         if axes is None:
             response = {"message": "Not Found"}
             return response, 404
@@ -330,24 +737,158 @@ class Line2D(flask_restx.Resource):
         except:
             response = {"message": "Bad Request"}
             return response, 400
-        line = axes.extract(line)
+        line = axes.series.get(line)
         if line is None:
             response = {"message": "Not Found"}
             return response, 404
         # **************************************************
         #   Process:
         # **************************************************
-        axes.remove(line.id)
+        if _Plotter.scene.remove_series(line) is None:
+            response = {"message": "Not Found"}
+            return response, 404
         response = {"message": "No Content"}
         return response, 204
 
 
+@_Namespace.route("/<axes>/<line>/data")
+class Data(flask_restx.Resource):
+
+    @_Api.doc(description="プロットデータを取得します。Acceptヘッダで形式 (application/json, application/octet-stream, application/x-npy) を指定します。ロールアップ階層がある場合は、期間と点数を満たす最も粗い階層の min, max, mean, count を返します。", params={"seconds": "期間(秒) (保持期間を超える場合は保持期間)", "points": "最小点数"}, responses={200: "Success", 400: "Bad Request", 404: "Not Found", 406: "Not Acceptable"})
+    def get(self, axes, line):
+        # **************************************************
+        #   Validate:
+        # **************************************************
+        try:
+            axes = uuid.UUID(axes)
+        except:
+            response = {"message": "Bad Request"}
+            return response, 400
+        axes = _Plotter.scene.panels.get(axes)
+        if axes is None:
+            response = {"message": "Not Found"}
+            return response, 404
+        try:
+            line = uuid.UUID(line)
+        except:
+            response = {"message": "Bad Request"}
+            return response, 400
+        line = axes.series.get(line)
+        if line is None:
+            response = {"message": "Not Found"}
+            return response, 404
+        seconds = flask.request.args.get("seconds", axes.seconds, type=int)
+        if seconds < 1:
+            response = {"message": "Bad Request"}
+            return response, 400
+        points = flask.request.args.get("points", 1000, type=int)
+        if points < 1:
+            response = {"message": "Bad Request"}
+            return response, 400
+        accept = flask.request.accept_mimetypes
+        mimetype = accept.best_match(_Mimetypes) if accept else _Mimetypes[0]
+        if mimetype is None:
+            response = {"message": "Not Acceptable"}
+            return response, 406
+        # **************************************************
+        #   Process:
+        # **************************************************
+        seconds = min(seconds, max(line.data.retained, 1))
+        step, x, y = line.data.rollup(seconds, points)
+        if step is None:
+            x, y = line.data.latest(seconds)
+            headers = {"X-Interval": str(line.interval), "X-Start": str(x[0])}
+        else:
+            headers = {"X-Interval": str(line.interval), "X-Start": str(x[0]), "X-Step": str(step), "X-Fields": "min,max,mean,count"}
+        if mimetype == "application/octet-stream":
+            bytes_ = y.astype("<f8", copy=False).tobytes()
+            response = flask.Response(bytes_, mimetype=mimetype, headers=headers)
+            return response
+        if mimetype == "application/x-npy":
+            buffer = io.BytesIO()
+            numpy.lib.format.write_array(buffer, y.astype("<f8", copy=False))
+            response = flask.Response(buffer.getvalue(), mimetype=mimetype, headers=headers)
+            return response
+        if step is not None:
+            response = {
+                "id": str(line.id),
+                "interval": line.interval,
+                "step": step,
+                "x": x.tolist(),
+                "min": [None if numpy.isnan(v) else v for v in y[:, 0].tolist()],
+                "max": [None if numpy.isnan(v) else v for v in y[:, 1].tolist()],
+                "mean": [None if numpy.isnan(v) else v for v in y[:, 2].tolist()],
+                "count": y[:, 3].tolist()
+            }
+            return response, 200
+        response = {
+            "id": str(line.id),
+            "interval": line.interval,
+            "x": x.tolist(),
+            "y": [None if numpy.isnan(v) else v for v in y.tolist()]
+        }
+        return response, 200
+
+
 if __name__ == "__main__":
-    kwargs = dict()
-    if len(sys.argv) > 1:
-        port = int(sys.argv[1])
-        kwargs["port"] = port
+    parser = argparse.ArgumentParser(prog="streamplotter")
+    parser.add_argument("port", type=int, nargs="?", default=5000, help="ポート番号")
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けアドレス")
+    parser.add_argument("--blit", action="store_true", help="変更されたデータ系列のみを再描画します")
+    parser.add_argument("--headless", action="store_true", help="ウィンドウを表示せず、画像をHTTPで配信します")
+    parser.add_argument("--render-process", action="store_true", help="描画を別プロセスで実行し、データを共有メモリで受け渡します")
+    parser.add_argument("--ingest-only", action="store_true", help="描画を行わず、データの受信とAPIのみを提供します (matplotlib を読み込みません)")
+    parser.add_argument("--store", metavar="DIR", help="レイアウトとデータをディレクトリに保存し、起動時に復元します")
+    parser.add_argument("--server", choices=["flask", "waitress"], default="flask", help="HTTPサーバー")
+    parser.add_argument("--threads", type=int, default=8, help="ワーカースレッド数 (waitress)")
+    parser.add_argument("--streams", type=int, default=4, help="Server-Sent Events の最大同時接続数 (waitress ではワーカースレッドとは別に確保します)")
+    parser.add_argument("--connections", type=int, default=100, help="最大同時接続数 (waitress)")
+    parser.add_argument("--keepalive", type=int, default=120, help="キープアライブ接続のアイドルタイムアウト(秒) (waitress)")
+    parser.add_argument("--max-seconds", type=int, default=604800, help="期間・保持期間・ロールアップ階層の保持期間の上限(秒)")
+    parser.add_argument("--fps", type=float, default=1.0, help="目標のフレームレート")
+    parser.add_argument("--min-fps", type=float, help="描画が間に合わない場合に下げるフレームレートの下限 (既定: 目標の1/4)")
+    parser.add_argument("--udp", type=int, metavar="PORT", help="UDPでプロットデータを受信するポート番号")
+    parser.add_argument("--tcp", type=int, metavar="PORT", help="TCPでプロットデータを受信するポート番号")
+    args = parser.parse_args()
+    if args.render_process and args.headless:
+        parser.error("--render-process と --headless は同時に指定できません")
+    if (args.threads < 1) or (args.streams < 0):
+        parser.error("--threads は1以上, --streams は0以上を指定してください")
+    if args.max_seconds < 1:
+        parser.error("--max-seconds は1以上を指定してください")
+    _MaxSeconds = args.max_seconds
+    if args.fps <= 0:
+        parser.error("--fps は正の値を指定してください")
+    if (args.min_fps is not None) and (args.min_fps <= 0):
+        parser.error("--min-fps は正の値を指定してください")
+    if args.ingest_only and (args.headless or args.render_process or args.blit):
+        parser.error("--ingest-only は --headless, --render-process, --blit と同時に指定できません")
+    serve = functools.partial(_App.run, host=args.host, port=args.port)
+    if args.server == "waitress":
+        try:
+            import waitress
+        except ImportError:
+            parser.error("waitress がインストールされていません (pip install waitress)")
+        serve = functools.partial(waitress.serve, _App, host=args.host, port=args.port, threads=args.threads + args.streams, connection_limit=args.connections, channel_timeout=args.keepalive)
+    _Plotter = _StreamPlotter(TITLE, blit=args.blit, headless=args.headless, ingest=args.ingest_only or args.render_process)
+    _Plotter.broadcaster.limit = args.streams
+    if args.render_process:
+        _Plotter.spawn(args.blit, False, args.fps, args.min_fps)
+        atexit.register(_Plotter.remote.close)
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    if args.store is not None:
+        _Plotter.open(args.store)
+    if (args.udp is not None) or (args.tcp is not None):
+        listener = _Listener(_Plotter.scene)
+        listener.start(args.host, args.udp, args.tcp)
+        _Plotter.metrics.collect("streamplotter_listener_points_total", "counter", "ソケットで受信したプロットデータ数", lambda: [({"result": "received"}, listener.received), ({"result": "rejected"}, listener.rejected)])
     _App.config["JSON_AS_ASCII"] = False
-    thread = threading.Thread(target=_App.run, kwargs=kwargs, daemon=True)
-    thread.start()
-    _Plotter.run()(_Plotter.update)()
+    if args.headless:
+        thread = threading.Thread(target=_Plotter.follow, args=(1 / args.fps,), daemon=True)
+        thread.start()
+    if args.headless or args.render_process or args.ingest_only:
+        serve()
+    else:
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        _Plotter.run(fps=args.fps, minimum=args.min_fps)(_Plotter.update)()